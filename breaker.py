@@ -0,0 +1,93 @@
+import fcntl
+import json
+import os
+import tempfile
+import time
+
+# Circuit breakers for slow upstreams (Pixabay, zenquotes.io, Gumroad), shared
+# by every bot on this machine through a flock-guarded JSON file. After
+# FAILURE_THRESHOLD consecutive failures a breaker opens and callers go
+# straight to their fallback instead of waiting out a timeout; once COOLDOWN
+# has passed a single caller is let through as a half-open probe, and its
+# result closes or re-opens the breaker.
+
+BREAKER_FILE = os.getenv(
+    "BOT_BREAKER_FILE", os.path.join(tempfile.gettempdir(), "bot-breakers.json")
+)
+FAILURE_THRESHOLD = 3
+COOLDOWN = 10 * 60      # seconds an open breaker waits before probing
+PROBE_TIMEOUT = 60      # a probe that never reports back is retried after this
+
+# ========== STATE ==========
+
+def locked_update(name, update):
+    with open(BREAKER_FILE, "a+") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            f.seek(0)
+            raw = f.read()
+            breakers = json.loads(raw) if raw.strip() else {}
+            breaker = breakers.setdefault(
+                name, {"state": "closed", "failures": 0, "opened_at": 0}
+            )
+            result = update(breaker, time.time())
+            f.seek(0)
+            f.truncate()
+            json.dump(breakers, f, indent=2, sort_keys=True)
+            return result
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+# ========== BREAKER ==========
+
+def allow(name):
+    def check(breaker, now):
+        if breaker["state"] == "closed":
+            return True
+        if breaker["state"] == "open" and now - breaker["opened_at"] >= COOLDOWN:
+            breaker["state"] = "half-open"
+            breaker["probe_at"] = now
+            return True
+        if breaker["state"] == "half-open" and now - breaker.get("probe_at", 0) >= PROBE_TIMEOUT:
+            breaker["probe_at"] = now
+            return True
+        return False
+
+    return locked_update(name, check)
+
+def record_success(name):
+    def close(breaker, now):
+        breaker.update(state="closed", failures=0)
+
+    locked_update(name, close)
+
+def record_failure(name):
+    def trip(breaker, now):
+        breaker["failures"] += 1
+        if breaker["state"] == "half-open" or breaker["failures"] >= FAILURE_THRESHOLD:
+            breaker.update(state="open", opened_at=now)
+
+    locked_update(name, trip)
+
+def call(name, fn, fallback=None, local_errors=()):
+    # local_errors are raised by fn before it reaches the upstream (a spent
+    # quota, say); they pass straight through without counting either way.
+    if not allow(name):
+        if fallback is None:
+            raise RuntimeError(f"❌ {name} is unavailable (circuit open).")
+        print(f"⚡ {name} circuit open, using fallback.")
+        return fallback()
+
+    try:
+        result = fn()
+    except local_errors:
+        raise
+    except Exception as e:
+        record_failure(name)
+        if fallback is None:
+            raise
+        print(f"⚠️ {name} failed ({e}), using fallback.")
+        return fallback()
+
+    record_success(name)
+    return result
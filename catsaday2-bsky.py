@@ -1,13 +1,22 @@
 import requests
-from datetime import datetime, timezone
-from PIL import Image
-from io import BytesIO
 import random
 from dotenv import load_dotenv
 import os
+import sys
+
+import breaker
+import http_trace
+import metrics
+import outbox
+from gallery import MAX_IMAGES, images_embed
+from history import History
+from pixabay_index import cache_hits, harvest, indexed_hits
+from pixabay_quota import QuotaExhausted, record_quota, reserve_quota
+from pixabay_select import compile_tags, select_hits
 
 # Load environment variables
 load_dotenv()
+http_trace.install()  # HTTP_TRACE=record|replay, see http_trace.py
 
 # ========== ENV CONFIG ==========
 
@@ -16,7 +25,11 @@ APP_PASSWORD = os.getenv("CATSADAY_APP_PASSWORD")
 
 BLUESKY_HANDLE = "catsaday.bsky.social"
 ALT_TEXT = ""
-IMAGE_PATH = "image.jpg"
+HISTORY_FILE = "catsaday-posted.txt"  # legacy text history, migrated on first run
+HISTORY_PATH = "catsaday-history"
+INDEX_PATH = "catsaday-index.db"
+IMAGES_PER_POST = min(int(os.getenv("CATSADAY_IMAGES_PER_POST", 1)), MAX_IMAGES)
+OUTBOX_PATH = "catsaday-outbox.json"
 
 # Safety check
 if not PIXABAY_API_KEY or not APP_PASSWORD:
@@ -41,47 +54,84 @@ MULTI_CAT_TAGS = [
     "cats playing",
 ]
 
+CAT_TOKENS = compile_tags(["cat", "cats", "kitten", "kittens", "kitty"])
+
+PIXABAY_PARAMS = {
+    "image_type": "photo",
+    "orientation": "horizontal",
+    "safesearch": "true",
+}
+
+# ========== HISTORY TRACKING ==========
+
+def load_posted_ids():
+    return History(HISTORY_PATH, legacy_path=HISTORY_FILE)
+
+def save_posted_ids(image_ids):
+    with load_posted_ids() as posted_ids:
+        for image_id in image_ids:
+            posted_ids.add(image_id)
+
 # ========== PIXABAY IMAGE ==========
 
-def get_pixabay_image():
+def search_pixabay(query):
+    reserve_quota()
+    res = requests.get(
+        "https://pixabay.com/api/",
+        params={"key": PIXABAY_API_KEY, "q": query, "per_page": 20, **PIXABAY_PARAMS},
+        timeout=15,
+    )
+    record_quota(res.headers)
+    res.raise_for_status()
+    hits = res.json().get("hits", [])
+    cache_hits(INDEX_PATH, query, hits)
+    return [{**hit, "query": query} for hit in hits]
+
+def get_pixabay_images():
+    posted_ids = load_posted_ids()
+
+    selected = select_hits(
+        indexed_hits(INDEX_PATH, CAT_TOKENS),
+        IMAGES_PER_POST,
+        tags=CAT_TOKENS,
+        posted_ids=posted_ids,
+        query_weights=metrics.query_weights(
+            BLUESKY_HANDLE, SOLO_CAT_TAGS + MULTI_CAT_TAGS
+        ),
+    )
+    if selected:
+        for image in selected:
+            print("🗂️ Selected indexed image:", image["url"])
+        return selected
+
     query = (
-        random.choice(SOLO_CAT_TAGS)
+        metrics.weighted_choice(BLUESKY_HANDLE, SOLO_CAT_TAGS)
         if random.random() < 0.5
-        else random.choice(MULTI_CAT_TAGS)
+        else metrics.weighted_choice(BLUESKY_HANDLE, MULTI_CAT_TAGS)
     )
 
     print(f"🔍 Searching Pixabay for: {query}")
 
-    url = (
-        "https://pixabay.com/api/"
-        f"?key={PIXABAY_API_KEY}"
-        f"&q={query.replace(' ', '+')}"
-        "&image_type=photo"
-        "&orientation=horizontal"
-        "&safesearch=true"
-        "&per_page=20"
+    # No fallback: the index was just searched. With the breaker open this
+    # fails at once, before any quota is reserved.
+    hits = breaker.call(
+        "pixabay",
+        lambda: search_pixabay(query),
+        local_errors=(QuotaExhausted,),
     )
 
-    res = requests.get(url, timeout=15)
-    res.raise_for_status()
-    data = res.json()
-
-    if not data.get("hits"):
+    if not hits:
         raise RuntimeError("No images found on Pixabay.")
 
-    image_url = random.choice(data["hits"])["largeImageURL"]
-    print("✅ Selected image:", image_url)
-    return image_url
-
-def download_image(image_url):
-    res = requests.get(image_url, timeout=20)
-    img = Image.open(BytesIO(res.content))
-
-    if img.mode != "RGB":
-        img = img.convert("RGB")
+    selected = select_hits(
+        hits, IMAGES_PER_POST, tags=CAT_TOKENS, posted_ids=posted_ids
+    )
+    if not selected:
+        raise RuntimeError("No usable cat images found on Pixabay.")
 
-    img.save(IMAGE_PATH, format="JPEG", quality=85, optimize=True)
-    print("✅ Image downloaded and saved.")
+    for image in selected:
+        print("✅ Selected image:", image["url"])
+    return selected
 
 # ========== BLUESKY API ==========
 
@@ -94,43 +144,21 @@ def create_session():
     res.raise_for_status()
     return res.json()
 
-def upload_image(access_token):
-    with open(IMAGE_PATH, "rb") as f:
-        image_data = f.read()
-
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "image/jpeg"
-    }
-
-    res = requests.post(
-        "https://bsky.social/xrpc/com.atproto.repo.uploadBlob",
-        headers=headers,
-        data=image_data,
-        timeout=15
+def find_post(access_token, did, rkey):
+    res = requests.get(
+        "https://bsky.social/xrpc/com.atproto.repo.getRecord",
+        headers={"Authorization": f"Bearer {access_token}"},
+        params={"repo": did, "collection": "app.bsky.feed.post", "rkey": rkey},
+        timeout=10
     )
-    res.raise_for_status()
-    return res.json()["blob"]
-
-def create_post(access_token, did, image_blob):
-    with Image.open(IMAGE_PATH) as img:
-        width, height = img.size
+    return res.json() if res.status_code == 200 else None
 
+def create_post(access_token, did, entry):
     post = {
         "$type": "app.bsky.feed.post",
         "text": "",
-        "createdAt": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
-        "embed": {
-            "$type": "app.bsky.embed.images",
-            "images": [{
-                "alt": ALT_TEXT,
-                "image": image_blob,
-                "aspectRatio": {
-                    "width": width,
-                    "height": height
-                }
-            }]
-        }
+        "createdAt": entry["created_at"],
+        "embed": images_embed(entry["uploaded"], ALT_TEXT)
     }
 
     headers = {
@@ -141,6 +169,7 @@ def create_post(access_token, did, image_blob):
     payload = {
         "repo": did,
         "collection": "app.bsky.feed.post",
+        "rkey": entry["rkey"],
         "record": post
     }
 
@@ -152,23 +181,42 @@ def create_post(access_token, did, image_blob):
     )
     res.raise_for_status()
     print("📤 Cat posted successfully!")
+    return res.json()
 
 # ========== MAIN ==========
 
-def main():
-    try:
-        image_url = get_pixabay_image()
-        download_image(image_url)
-
-        session = create_session()
-        access_token = session["accessJwt"]
-        did = session["did"]
+def retire_images(entry):
+    save_posted_ids(image["id"] for image in entry["images"])
 
-        image_blob = upload_image(access_token)
-        create_post(access_token, did, image_blob)
+def record_posted(entry):
+    metrics.record_post(
+        BLUESKY_HANDLE,
+        entry["uri"],
+        entry["cid"],
+        query=entry["images"][0].get("query"),
+        tags=", ".join(image["tags"] for image in entry["images"]),
+    )
+    retire_images(entry)
 
+def main():
+    try:
+        outbox.run(
+            OUTBOX_PATH,
+            BLUESKY_HANDLE,
+            choose=lambda: {"images": get_pixabay_images()},
+            image_urls=lambda entry: [image["url"] for image in entry["images"]],
+            cdn="pixabay-cdn",
+            create_session=create_session,
+            create_post=create_post,
+            find_post=find_post,
+            finish=record_posted,
+            retire=retire_images,
+        )
     except Exception as e:
         print("😿 Cats‑A‑Day error:", e)
 
 if __name__ == "__main__":
-    main()
+    if "--harvest" in sys.argv[1:]:
+        harvest(INDEX_PATH, PIXABAY_API_KEY, SOLO_CAT_TAGS + MULTI_CAT_TAGS, PIXABAY_PARAMS)
+    else:
+        main()
@@ -1,13 +1,21 @@
 import requests
-from datetime import datetime, timezone
-from PIL import Image
-from io import BytesIO
-import random
 from dotenv import load_dotenv
 import os
+import sys
+
+import breaker
+import http_trace
+import metrics
+import outbox
+from gallery import MAX_IMAGES, images_embed
+from history import History
+from pixabay_index import cache_hits, harvest, indexed_hits
+from pixabay_quota import QuotaExhausted, record_quota, reserve_quota
+from pixabay_select import compile_tags, select_hits
 
 # Load environment variables
 load_dotenv()
+http_trace.install()  # HTTP_TRACE=record|replay, see http_trace.py
 
 # ========== ENV CONFIG ==========
 
@@ -16,7 +24,11 @@ APP_PASSWORD = os.getenv("CHICKENADAY_APP_PASSWORD")
 BLUESKY_HANDLE = "chickenaday.bsky.social"
 
 ALT_TEXT = ""
-IMAGE_PATH = "image.jpg"
+HISTORY_FILE = "chickenaday-posted.txt"  # legacy text history, migrated on first run
+HISTORY_PATH = "chickenaday-history"
+INDEX_PATH = "chickenaday-index.db"
+IMAGES_PER_POST = min(int(os.getenv("CHICKENADAY_IMAGES_PER_POST", 1)), MAX_IMAGES)
+OUTBOX_PATH = "chickenaday-outbox.json"
 
 # Safety check
 if not PIXABAY_API_KEY or not APP_PASSWORD:
@@ -28,49 +40,79 @@ SEARCH_TERMS = [
     "chicken",
 ]
 
-# ========== PIXABAY IMAGE ==========
+CHICKEN_TOKENS = compile_tags([
+    "chicken", "chickens", "rooster", "hen", "hens", "chick", "chicks",
+])
 
-def get_pixabay_image():
-    query = random.choice(SEARCH_TERMS)
-    print(f"🔍 Searching Pixabay for: {query}")
+PIXABAY_PARAMS = {
+    "image_type": "photo",
+    "orientation": "horizontal",
+    "category": "animals",
+    "safesearch": "true",
+}
 
-    url = (
-        "https://pixabay.com/api/"
-        f"?key={PIXABAY_API_KEY}"
-        f"&q={query.replace(' ', '+')}"
-        "&category=animals"
-        "&image_type=photo"
-        "&orientation=horizontal"
-        "&safesearch=true"
-        "&per_page=20"
-    )
+# ========== HISTORY TRACKING ==========
 
-    res = requests.get(url, timeout=15)
-    res.raise_for_status()
-    data = res.json()
+def load_posted_ids():
+    return History(HISTORY_PATH, legacy_path=HISTORY_FILE)
 
-    chicken_images = [
-        hit for hit in data["hits"]
-        if any(word in hit["tags"].lower() for word in ["chicken", "rooster", "hen", "chick"])
-    ]
+def save_posted_ids(image_ids):
+    with load_posted_ids() as posted_ids:
+        for image_id in image_ids:
+            posted_ids.add(image_id)
 
-    if not chicken_images:
-        raise RuntimeError("❌ No clearly chicken-related images found!")
+# ========== PIXABAY IMAGE ==========
 
-    selected = random.choice(chicken_images)
-    print("✅ Selected image:", selected["largeImageURL"])
-    print("📝 Tags:", selected["tags"])
-    return selected["largeImageURL"]
+def search_pixabay(query):
+    reserve_quota()
+    res = requests.get(
+        "https://pixabay.com/api/",
+        params={"key": PIXABAY_API_KEY, "q": query, "per_page": 20, **PIXABAY_PARAMS},
+        timeout=15,
+    )
+    record_quota(res.headers)
+    res.raise_for_status()
+    hits = res.json().get("hits", [])
+    cache_hits(INDEX_PATH, query, hits)
+    return [{**hit, "query": query} for hit in hits]
+
+def get_pixabay_images():
+    posted_ids = load_posted_ids()
+
+    selected = select_hits(
+        indexed_hits(INDEX_PATH, CHICKEN_TOKENS),
+        IMAGES_PER_POST,
+        tags=CHICKEN_TOKENS,
+        posted_ids=posted_ids,
+        query_weights=metrics.query_weights(BLUESKY_HANDLE, SEARCH_TERMS),
+    )
+    if selected:
+        for image in selected:
+            print("🗂️ Selected indexed image:", image["url"])
+        return selected
 
-def download_image(image_url):
-    res = requests.get(image_url, timeout=20)
-    img = Image.open(BytesIO(res.content))
+    query = metrics.weighted_choice(BLUESKY_HANDLE, SEARCH_TERMS)
+    print(f"🔍 Searching Pixabay for: {query}")
+
+    # No fallback: the index was just searched. With the breaker open this
+    # fails at once, before any quota is reserved.
+    hits = breaker.call(
+        "pixabay",
+        lambda: search_pixabay(query),
+        local_errors=(QuotaExhausted,),
+    )
+
+    selected = select_hits(
+        hits, IMAGES_PER_POST, tags=CHICKEN_TOKENS, posted_ids=posted_ids
+    )
 
-    if img.mode != "RGB":
-        img = img.convert("RGB")
+    if not selected:
+        raise RuntimeError("❌ No clearly chicken-related images found!")
 
-    img.save(IMAGE_PATH, format="JPEG", quality=85, optimize=True)
-    print("✅ Image downloaded and saved.")
+    for image in selected:
+        print("✅ Selected image:", image["url"])
+        print("📝 Tags:", image["tags"])
+    return selected
 
 # ========== BLUESKY API ==========
 
@@ -83,43 +125,21 @@ def create_session():
     res.raise_for_status()
     return res.json()
 
-def upload_image(access_token):
-    with open(IMAGE_PATH, "rb") as f:
-        image_data = f.read()
-
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "image/jpeg"
-    }
-
-    res = requests.post(
-        "https://bsky.social/xrpc/com.atproto.repo.uploadBlob",
-        headers=headers,
-        data=image_data,
-        timeout=15
+def find_post(access_token, did, rkey):
+    res = requests.get(
+        "https://bsky.social/xrpc/com.atproto.repo.getRecord",
+        headers={"Authorization": f"Bearer {access_token}"},
+        params={"repo": did, "collection": "app.bsky.feed.post", "rkey": rkey},
+        timeout=10
     )
-    res.raise_for_status()
-    return res.json()["blob"]
-
-def create_post(access_token, did, image_blob):
-    with Image.open(IMAGE_PATH) as img:
-        width, height = img.size
+    return res.json() if res.status_code == 200 else None
 
+def create_post(access_token, did, entry):
     post = {
         "$type": "app.bsky.feed.post",
         "text": "",
-        "createdAt": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
-        "embed": {
-            "$type": "app.bsky.embed.images",
-            "images": [{
-                "alt": ALT_TEXT,
-                "image": image_blob,
-                "aspectRatio": {
-                    "width": width,
-                    "height": height
-                }
-            }]
-        }
+        "createdAt": entry["created_at"],
+        "embed": images_embed(entry["uploaded"], ALT_TEXT)
     }
 
     headers = {
@@ -130,6 +150,7 @@ def create_post(access_token, did, image_blob):
     payload = {
         "repo": did,
         "collection": "app.bsky.feed.post",
+        "rkey": entry["rkey"],
         "record": post
     }
 
@@ -141,23 +162,42 @@ def create_post(access_token, did, image_blob):
     )
     res.raise_for_status()
     print("📤 Chicken posted successfully!")
+    return res.json()
 
 # ========== MAIN ==========
 
-def main():
-    try:
-        image_url = get_pixabay_image()
-        download_image(image_url)
-
-        session = create_session()
-        access_token = session["accessJwt"]
-        did = session["did"]
+def retire_images(entry):
+    save_posted_ids(image["id"] for image in entry["images"])
 
-        image_blob = upload_image(access_token)
-        create_post(access_token, did, image_blob)
+def record_posted(entry):
+    metrics.record_post(
+        BLUESKY_HANDLE,
+        entry["uri"],
+        entry["cid"],
+        query=entry["images"][0].get("query"),
+        tags=", ".join(image["tags"] for image in entry["images"]),
+    )
+    retire_images(entry)
 
+def main():
+    try:
+        outbox.run(
+            OUTBOX_PATH,
+            BLUESKY_HANDLE,
+            choose=lambda: {"images": get_pixabay_images()},
+            image_urls=lambda entry: [image["url"] for image in entry["images"]],
+            cdn="pixabay-cdn",
+            create_session=create_session,
+            create_post=create_post,
+            find_post=find_post,
+            finish=record_posted,
+            retire=retire_images,
+        )
     except Exception as e:
         print("🐔 Chicken bot error:", e)
 
 if __name__ == "__main__":
-    main()
+    if "--harvest" in sys.argv[1:]:
+        harvest(INDEX_PATH, PIXABAY_API_KEY, SEARCH_TERMS, PIXABAY_PARAMS)
+    else:
+        main()
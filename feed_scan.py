@@ -0,0 +1,95 @@
+import json
+import os
+from datetime import datetime
+
+import requests
+
+# Incremental author-feed scanning for the like-ring. Each target has a
+# watermark (the newest feed timestamp seen on the last run); a scan pages
+# back with `cursor` only until it reaches that watermark, so a run reads just
+# the delta since the previous one.
+
+AUTHOR_FEED = "https://bsky.social/xrpc/app.bsky.feed.getAuthorFeed"
+PAGE_LIMIT = 50
+MAX_PAGES = 10
+
+# ========== WATERMARKS ==========
+
+def load_watermarks(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+def save_watermarks(path, watermarks):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(watermarks, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+# ========== FEED ITEMS ==========
+
+def parse_time(value):
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+def item_time(item):
+    # Reposts are sorted into the feed by the time of the repost.
+    reason = item.get("reason")
+    if reason and reason.get("indexedAt"):
+        return reason["indexedAt"]
+    return item["post"]["indexedAt"]
+
+def is_original_post(item, did):
+    post = item["post"]
+    return (
+        not item.get("reason")
+        and post["author"]["did"] == did
+        and "reply" not in post.get("record", {})
+    )
+
+def fetch_feed_page(actor, access_token, cursor=None):
+    params = {"actor": actor, "limit": PAGE_LIMIT, "filter": "posts_no_replies"}
+    if cursor:
+        params["cursor"] = cursor
+
+    res = requests.get(
+        AUTHOR_FEED,
+        headers={"Authorization": f"Bearer {access_token}"},
+        params=params,
+        timeout=15,
+    )
+    res.raise_for_status()
+    return res.json()
+
+# ========== SCAN ==========
+
+def scan_author_feed(actor, did, access_token, watermark=None):
+    # Returns (new original posts oldest first, new watermark). Without a
+    # watermark only the newest original post is returned, so a first run
+    # doesn't like the target's whole history.
+    since = parse_time(watermark) if watermark else None
+    newest = watermark
+    posts = []
+    cursor = None
+
+    for _ in range(MAX_PAGES):
+        page = fetch_feed_page(actor, access_token, cursor)
+        feed = page.get("feed", [])
+
+        for item in feed:
+            seen_at = item_time(item)
+            if since and parse_time(seen_at) <= since:
+                return list(reversed(posts)), newest
+            if newest is None or parse_time(seen_at) > parse_time(newest):
+                newest = seen_at
+
+            if is_original_post(item, did):
+                posts.append({"uri": item["post"]["uri"], "cid": item["post"]["cid"]})
+                if not since:
+                    return posts, newest
+
+        cursor = page.get("cursor")
+        if not cursor or not feed:
+            break
+
+    return list(reversed(posts)), newest
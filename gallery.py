@@ -0,0 +1,79 @@
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import requests
+from PIL import Image
+
+# Multi-image (gallery) posts: images are downloaded and re-encoded in
+# parallel, and their blobs uploaded concurrently, so a post with four
+# images takes about as long as its slowest image rather than the sum.
+
+MAX_IMAGES = 4              # app.bsky.embed.images limit
+BLOB_LIMIT = 1_000_000      # Bluesky uploadBlob limit for images (bytes)
+JPEG_QUALITIES = (85, 75, 65, 55)
+
+# ========== DOWNLOAD ==========
+
+def encode_jpeg(img):
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+
+    # Step the quality down until the image fits in a blob, then fall back to
+    # halving the dimensions.
+    while True:
+        for quality in JPEG_QUALITIES:
+            out = BytesIO()
+            img.save(out, format="JPEG", quality=quality, optimize=True)
+            if out.tell() <= BLOB_LIMIT:
+                return out.getvalue(), img.size
+        img = img.resize((img.width // 2, img.height // 2))
+
+def download_image(image_url, timeout=20):
+    res = requests.get(image_url, timeout=timeout)
+    res.raise_for_status()
+    data, (width, height) = encode_jpeg(Image.open(BytesIO(res.content)))
+    return {"data": data, "aspect_ratio": {"width": width, "height": height}}
+
+def download_images(image_urls, timeout=20):
+    with ThreadPoolExecutor(max_workers=len(image_urls) or 1) as pool:
+        images = list(pool.map(lambda url: download_image(url, timeout), image_urls))
+    print(f"✅ {len(images)} image(s) downloaded and encoded.")
+    return images
+
+# ========== UPLOAD ==========
+
+def upload_blob(access_token, data):
+    res = requests.post(
+        "https://bsky.social/xrpc/com.atproto.repo.uploadBlob",
+        headers={
+            "Authorization": f"Bearer {access_token}",
+            "Content-Type": "image/jpeg"
+        },
+        data=data,
+        timeout=15
+    )
+    res.raise_for_status()
+    return res.json()["blob"]
+
+def upload_images(access_token, images):
+    with ThreadPoolExecutor(max_workers=len(images) or 1) as pool:
+        blobs = list(pool.map(lambda image: upload_blob(access_token, image["data"]), images))
+    return [
+        {"blob": blob, "aspect_ratio": image["aspect_ratio"]}
+        for blob, image in zip(blobs, images)
+    ]
+
+# ========== EMBED ==========
+
+def images_embed(uploaded, alt=""):
+    return {
+        "$type": "app.bsky.embed.images",
+        "images": [
+            {
+                "alt": alt,
+                "image": image["blob"],
+                "aspectRatio": image["aspect_ratio"]
+            }
+            for image in uploaded[:MAX_IMAGES]
+        ]
+    }
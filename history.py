@@ -0,0 +1,267 @@
+import fcntl
+import hashlib
+import heapq
+import math
+import mmap
+import os
+import struct
+import time
+from contextlib import contextmanager
+
+# Posting history that stays cheap to open however long a bot has been
+# running. Each ID is stored as a fixed-width record - an 8-byte hash of the
+# ID and a 4-byte timestamp - in three files next to `path`:
+#
+#   <path>.idx     records sorted by hash, mmap'd and binary searched
+#   <path>.bloom   Bloom filter over the .idx hashes, mmap'd
+#   <path>.log     records added since the last merge, in arrival order
+#
+# Opening a history reads only the .log, which is merged into .idx once it
+# holds JOURNAL_LIMIT records, so the Python heap never holds more than that
+# many IDs. Everything else is mmap'd page cache the kernel can reclaim: a
+# lookup touches a handful of bloom pages and, on a hit, about log2(n) index pages.
+# With the defaults that puts the memory ceiling at roughly 1 MB of heap no
+# matter how many IDs are stored, and 64-bit hashes keep the chance of any
+# collision below one in ten million for a million IDs.
+#
+# Several processes may share a history (the like-ring cron and its listener),
+# so appends and merges hold a flock on <path>.lock, and a merge re-reads the
+# .log and .idx under it: records another process appended since this one
+# opened the history are merged, not truncated away.
+
+RECORD = struct.Struct(">QI")       # big-endian, so byte order is sort order
+BLOOM_HEADER = struct.Struct(">QI")  # bit count, hash count
+JOURNAL_LIMIT = 4096
+FALSE_POSITIVE_RATE = 0.01
+
+# ========== RECORDS ==========
+
+def id_hash(item_id):
+    digest = hashlib.blake2b(str(item_id).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+def read_records(data):
+    usable = len(data) - len(data) % RECORD.size  # ignore a torn final write
+    return RECORD.iter_unpack(data[:usable])
+
+def mapped_records(mapped):
+    # Unpacks in place, so merging a large index never copies it to the heap.
+    for offset in range(0, len(mapped or b"") - RECORD.size + 1, RECORD.size):
+        yield RECORD.unpack_from(mapped, offset)
+
+def write_atomic(path, chunks):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        for chunk in chunks:
+            f.write(chunk)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def read_journal(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, "rb") as f:
+        return {key: ts for key, ts in read_records(f.read())}
+
+def map_file(path):
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return None
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+# ========== BLOOM FILTER ==========
+
+def bloom_size(count, rate=FALSE_POSITIVE_RATE):
+    bits = max(64, math.ceil(-count * math.log(rate) / math.log(2) ** 2))
+    hashes = max(1, round(bits / max(count, 1) * math.log(2)))
+    return bits, hashes
+
+def bloom_positions(key, bits, hashes):
+    # Double hashing: the two halves of the 64-bit key give every probe.
+    low, high = key & 0xFFFFFFFF, key >> 32
+    return ((low + i * high) % bits for i in range(hashes))
+
+def create_bloom(path, count):
+    bits, hashes = bloom_size(count)
+    with open(path, "wb") as f:
+        f.write(BLOOM_HEADER.pack(bits, hashes))
+        f.truncate(BLOOM_HEADER.size + (bits + 7) // 8)
+    with open(path, "r+b") as f:
+        return mmap.mmap(f.fileno(), 0)
+
+def bloom_add(bloom, key):
+    bits, hashes = BLOOM_HEADER.unpack_from(bloom)
+    offset = BLOOM_HEADER.size
+    for pos in bloom_positions(key, bits, hashes):
+        bloom[offset + (pos >> 3)] |= 1 << (pos & 7)
+
+def bloom_contains(bloom, key):
+    bits, hashes = BLOOM_HEADER.unpack_from(bloom)
+    offset = BLOOM_HEADER.size
+    return all(
+        bloom[offset + (pos >> 3)] & (1 << (pos & 7))
+        for pos in bloom_positions(key, bits, hashes)
+    )
+
+# ========== HISTORY ==========
+
+class History:
+    def __init__(self, path, bloom=True, max_age=None, legacy_path=None):
+        self.path = path
+        self.use_bloom = bloom
+        self.max_age = max_age
+        self.index = None
+        self.bloom = None
+        self.journal = read_journal(f"{path}.log")
+        self.remap()
+
+        if legacy_path and os.path.exists(legacy_path):
+            self.import_text(legacy_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __contains__(self, item_id):
+        key = id_hash(item_id)
+        if key in self.journal:
+            return True
+        if self.index is None:
+            return False
+        if self.bloom is not None and not bloom_contains(self.bloom, key):
+            return False
+        return self.search(key)
+
+    def search(self, key):
+        target = key.to_bytes(8, "big")
+        size = RECORD.size
+        lo, hi = 0, len(self.index) // size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            probe = self.index[mid * size:mid * size + 8]
+            if probe < target:
+                lo = mid + 1
+            elif probe > target:
+                hi = mid
+            else:
+                return True
+        return False
+
+    def remap(self):
+        self.close()
+        self.index = map_file(f"{self.path}.idx")
+        self.bloom = map_file(f"{self.path}.bloom") if self.use_bloom else None
+
+    @contextmanager
+    def locked(self):
+        with open(f"{self.path}.lock", "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def close(self):
+        for mapped in (self.index, self.bloom):
+            if mapped is not None:
+                mapped.close()
+        self.index = self.bloom = None
+
+    def add(self, item_id, timestamp=None):
+        key = id_hash(item_id)
+        ts = int(timestamp if timestamp is not None else time.time())
+        with self.locked():
+            with open(f"{self.path}.log", "ab") as f:
+                f.write(RECORD.pack(key, ts))
+                logged = f.tell() // RECORD.size
+            self.journal[key] = ts
+            if logged >= JOURNAL_LIMIT:
+                self.merge()
+
+    def import_text(self, text_path):
+        # One-off migration from the old one-ID-per-line history files. The
+        # whole file goes through the journal and a single merge, so the
+        # index is sorted and written once rather than every JOURNAL_LIMIT IDs.
+        # Until the rename, a crash just means the import runs again.
+        with self.locked():
+            if not os.path.exists(text_path):
+                return  # another process migrated it first
+            timestamp = int(os.path.getmtime(text_path))
+            with open(text_path, "r") as f:
+                imported = {id_hash(line.strip()): timestamp for line in f if line.strip()}
+            imported.update(self.journal)  # entries already journaled are newer
+            self.journal = imported
+            self.merge()
+            os.replace(text_path, f"{text_path}.migrated")
+
+    def compact(self, max_age=None):
+        with self.locked():
+            return self.merge(max_age)
+
+    def merge(self, max_age=None):
+        # Callers hold the lock. Another process may have appended to the
+        # .log or replaced the .idx since this history was opened, so both
+        # are picked up again; imported entries exist only in memory and are
+        # kept.
+        self.journal = {**self.journal, **read_journal(f"{self.path}.log")}
+        self.remap()
+
+        max_age = max_age if max_age is not None else self.max_age
+        cutoff = time.time() - max_age if max_age is not None else 0
+
+        # Stream-merge the sorted index with the sorted journal, keeping the
+        # newest timestamp per key and dropping anything older than the cutoff.
+        def merged():
+            journal = sorted(self.journal.items())
+            last_key = None
+            for key, ts in heapq.merge(journal, mapped_records(self.index)):
+                if key == last_key:
+                    continue
+                last_key = key
+                latest = max(ts, self.journal.get(key, ts))
+                if latest >= cutoff:
+                    yield key, latest
+
+        # The filter is sized for the upper bound, so it is built in the same
+        # pass, straight into its own mmap'd file.
+        upper_bound = len(self.index or b"") // RECORD.size + len(self.journal)
+        tmp_idx = f"{self.path}.idx.tmp"
+        tmp_bloom = f"{self.path}.bloom.tmp"
+        bloom = create_bloom(tmp_bloom, upper_bound) if self.use_bloom else None
+
+        count = 0
+        with open(tmp_idx, "wb") as f:
+            for key, ts in merged():
+                f.write(RECORD.pack(key, ts))
+                if bloom is not None:
+                    bloom_add(bloom, key)
+                count += 1
+            f.flush()
+            os.fsync(f.fileno())
+        self.close()
+
+        # The new filter goes in before the new index: it covers every key
+        # the old index still holds, so a crash in between never hides an ID.
+        if bloom is not None:
+            bloom.flush()
+            bloom.close()
+            os.replace(tmp_bloom, f"{self.path}.bloom")
+        elif os.path.exists(f"{self.path}.bloom"):
+            os.remove(f"{self.path}.bloom")
+        os.replace(tmp_idx, f"{self.path}.idx")
+        write_atomic(f"{self.path}.log", [])
+
+        self.journal = {}
+        self.remap()
+        return count
+
+    def clear(self):
+        with self.locked():
+            self.close()
+            for suffix in (".idx", ".bloom", ".log"):
+                if os.path.exists(f"{self.path}{suffix}"):
+                    os.remove(f"{self.path}{suffix}")
+            self.journal = {}
@@ -0,0 +1,225 @@
+import atexit
+import base64
+import gzip
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import date, timedelta
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+import breaker
+import pixabay_quota
+
+# Record-and-replay of a bot's HTTP traffic, for profiling slow production
+# runs offline. Every call made through `requests` goes via Session.send, which
+# install() patches according to HTTP_TRACE:
+#
+#   record   calls go out as usual; each request/response pair is appended,
+#            with its latency, sizes and headers, to HTTP_TRACE_FILE
+#   replay   nothing goes out; each call is answered from the trace after
+#            sleeping its recorded latency divided by HTTP_TRACE_SPEED
+#            (0 answers immediately)
+#
+# The trace is gzipped JSON lines, starting with the seed `random` was given
+# and the date it was recorded on (see today()), so replays make the same
+# choices. Replay keeps its circuit breakers in a scratch file and does not
+# pace Pixabay calls, so it can neither trip the machine's shared breakers nor
+# spend or wait on its quota. Secrets are redacted from URLs, headers
+# and session responses before anything is written. Local state (outboxes,
+# indexes, history) is not part of the trace, so replay against a copy of the
+# working directory as it was when the run was recorded:
+#
+#   HTTP_TRACE=replay HTTP_TRACE_SPEED=0 python -m cProfile -s cumtime trackly.py
+
+DEFAULT_TRACE_FILE = "http-trace.jsonl.gz"
+
+SECRET_PARAMS = re.compile(r"([?&](?:key|access_token|token)=)[^&]*")
+SECRET_HEADERS = {"authorization", "cookie", "set-cookie"}
+SECRET_FIELDS = {"accessJwt", "refreshJwt", "password"}
+REDACTED = "REDACTED"
+
+original_send = requests.Session.send
+recorded_date = None    # set by install() when replaying
+
+# ========== REDACTION ==========
+
+def redact_url(url):
+    return SECRET_PARAMS.sub(rf"\g<1>{REDACTED}", url)
+
+def redact_headers(headers):
+    return {
+        name: REDACTED if name.lower() in SECRET_HEADERS else value
+        for name, value in headers.items()
+    }
+
+def redact_body(content, headers):
+    if "json" not in headers.get("Content-Type", ""):
+        return content
+    try:
+        data = json.loads(content)
+    except ValueError:
+        return content
+    if isinstance(data, dict) and SECRET_FIELDS & data.keys():
+        data = {
+            key: REDACTED if key in SECRET_FIELDS else value
+            for key, value in data.items()
+        }
+        return json.dumps(data).encode()
+    return content
+
+# ========== RECORD ==========
+
+class Recorder:
+    def __init__(self, path, seed):
+        self.file = gzip.open(path, "wt")
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.write({
+            "seed": seed,
+            "date": date.today().isoformat(),
+            "argv": sys.argv,
+            "recorded_at": time.time(),
+        })
+        atexit.register(self.file.close)
+
+    def write(self, event):
+        with self.lock:
+            self.file.write(json.dumps(event) + "\n")
+            self.file.flush()  # a crashed run still leaves a readable trace
+
+    def send(self, session, request, **kwargs):
+        event = {
+            "offset": round(time.perf_counter() - self.started, 6),
+            "method": request.method,
+            "url": redact_url(request.url),
+            "request_headers": redact_headers(request.headers),
+            "request_size": len(request.body or b""),
+        }
+        start = time.perf_counter()
+        try:
+            res = original_send(session, request, **kwargs)
+        except requests.RequestException as e:
+            event.update(
+                elapsed=round(time.perf_counter() - start, 6),
+                error=type(e).__name__,
+                message=str(e),
+            )
+            self.write(event)
+            raise
+
+        content = res.content
+        event.update(
+            elapsed=round(time.perf_counter() - start, 6),
+            status=res.status_code,
+            reason=res.reason,
+            headers=redact_headers(res.headers),
+            size=len(content),
+        )
+        body = redact_body(content, res.headers)
+        try:
+            event["text"] = body.decode("utf-8")  # compresses far better than base64
+        except UnicodeDecodeError:
+            event["body"] = base64.b64encode(body).decode()
+        self.write(event)
+        return res
+
+# ========== REPLAY ==========
+
+def load_trace(path):
+    header, events = None, []
+    with gzip.open(path, "rt") as f:
+        try:
+            for line in f:
+                if header is None:
+                    header = json.loads(line)
+                else:
+                    events.append(json.loads(line))
+        except EOFError:
+            pass  # recorded run was killed mid-write; keep what is complete
+    return header or {}, events
+
+class Replayer:
+    def __init__(self, events, speed):
+        self.speed = speed
+        self.lock = threading.Lock()
+        self.pending = defaultdict(deque)
+        for event in events:
+            self.pending[(event["method"], event["url"])].append(event)
+
+    def next_event(self, request):
+        key = (request.method, redact_url(request.url))
+        with self.lock:
+            if not self.pending[key]:
+                raise requests.ConnectionError(f"No recorded response for {key[0]} {key[1]}")
+            return self.pending[key].popleft()
+
+    def send(self, session, request, **kwargs):
+        event = self.next_event(request)
+        if self.speed > 0:
+            time.sleep(event["elapsed"] / self.speed)
+
+        if "error" in event:
+            error = getattr(requests.exceptions, event["error"], requests.RequestException)
+            raise error(event["message"], request=request)
+
+        res = requests.Response()
+        res.status_code = event["status"]
+        res.reason = event.get("reason")
+        res.headers = CaseInsensitiveDict(event["headers"])
+        res._content = (
+            event["text"].encode("utf-8") if "text" in event
+            else base64.b64decode(event["body"])
+        )
+        res.encoding = requests.utils.get_encoding_from_headers(res.headers)
+        res.url = request.url
+        res.request = request
+        res.elapsed = timedelta(seconds=event["elapsed"])
+        return res
+
+# ========== INSTALL ==========
+
+def today():
+    # Date-seeded choices (the like-ring topology) use this instead of
+    # date.today(), so a replay on a later day plans the recorded run.
+    return date.fromisoformat(recorded_date) if recorded_date else date.today()
+
+def isolate_local_state():
+    scratch = tempfile.mkdtemp(prefix="http-trace-")
+    breaker.BREAKER_FILE = os.path.join(scratch, "bot-breakers.json")
+    pixabay_quota.PACING = False
+
+def install():
+    global recorded_date
+
+    # Read at call time, so bots can call this after load_dotenv().
+    mode = os.getenv("HTTP_TRACE", "")
+    path = os.getenv("HTTP_TRACE_FILE", DEFAULT_TRACE_FILE)
+    speed = float(os.getenv("HTTP_TRACE_SPEED", 1))
+
+    if mode == "record":
+        seed = int(os.getenv("HTTP_TRACE_SEED", random.randrange(2**32)))
+        handler = Recorder(path, seed)
+        print(f"🎙️ Recording HTTP trace to {path} (seed {seed})")
+    elif mode == "replay":
+        header, events = load_trace(path)
+        seed = header.get("seed")
+        recorded_date = header.get("date")
+        handler = Replayer(events, speed)
+        isolate_local_state()
+        print(f"⏯️ Replaying {len(events)} HTTP calls from {path} at {speed}x (seed {seed})")
+    else:
+        return None
+
+    random.seed(seed)
+    requests.Session.send = lambda session, request, **kwargs: handler.send(
+        session, request, **kwargs
+    )
+    return handler
@@ -0,0 +1,152 @@
+import json
+import os
+import sys
+import time
+from urllib.parse import parse_qs, urlencode, urlparse
+
+from websockets.sync.client import connect
+from websockets.sync.server import serve
+
+# Jetstream subscription for the like-ring: new app.bsky.feed.post records
+# from the fleet's DIDs arrive over a WebSocket within seconds of creation,
+# instead of being polled for. The last handled event's time_us is persisted
+# as the resume cursor.
+#
+# For local testing, `python jetstream.py replay events.jsonl [port]` serves a
+# captured JSONL stream of Jetstream events as a WebSocket endpoint; point the
+# listener at it with JETSTREAM_URL=ws://localhost:<port>/subscribe.
+
+JETSTREAM_URL = os.getenv(
+    "JETSTREAM_URL", "wss://jetstream2.us-east.bsky.network/subscribe"
+)
+POST_COLLECTION = "app.bsky.feed.post"
+CURSOR_SAVE_INTERVAL = 5        # seconds between cursor writes
+RECONNECT_DELAYS = (1, 2, 5, 10, 30)
+REPLAY_PORT = 8765
+
+# ========== CURSOR ==========
+
+def load_cursor(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        value = f.read().strip()
+    return int(value) if value else None
+
+def save_cursor(path, cursor):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(f"{cursor}\n")
+    os.replace(tmp_path, path)
+
+# ========== EVENTS ==========
+
+def subscribe_url(base_url, dids, cursor=None):
+    params = [("wantedCollections", POST_COLLECTION)]
+    params += [("wantedDids", did) for did in dids]
+    if cursor:
+        params.append(("cursor", cursor))
+    return f"{base_url}?{urlencode(params)}"
+
+def post_from_event(event, dids):
+    commit = event.get("commit") or {}
+    if (
+        event.get("kind") != "commit"
+        or event.get("did") not in dids
+        or commit.get("operation") != "create"
+        or commit.get("collection") != POST_COLLECTION
+        or "reply" in (commit.get("record") or {})
+    ):
+        return None
+
+    return {
+        "did": event["did"],
+        "uri": f"at://{event['did']}/{POST_COLLECTION}/{commit['rkey']}",
+        "cid": commit["cid"],
+        "time_us": event["time_us"],
+    }
+
+# ========== LISTENER ==========
+
+def listen(dids, on_post, cursor_path, base_url=JETSTREAM_URL):
+    cursor = load_cursor(cursor_path)
+    saved_cursor = cursor
+    saved_at = time.monotonic()
+    failures = 0
+
+    while True:
+        try:
+            with connect(subscribe_url(base_url, dids, cursor)) as ws:
+                print(f"📡 Subscribed to Jetstream for {len(dids)} DIDs (cursor {cursor})")
+                failures = 0
+
+                for message in ws:
+                    event = json.loads(message)
+                    time_us = event.get("time_us")
+
+                    # The cursor is inclusive, so the event it points at comes
+                    # around again after a reconnect.
+                    if cursor and time_us and time_us <= cursor:
+                        continue
+
+                    post = post_from_event(event, dids)
+                    if post:
+                        on_post(post)
+
+                    if time_us:
+                        cursor = time_us
+                    if cursor != saved_cursor and time.monotonic() - saved_at >= CURSOR_SAVE_INTERVAL:
+                        save_cursor(cursor_path, cursor)
+                        saved_cursor, saved_at = cursor, time.monotonic()
+
+            print("⚠️ Jetstream closed the connection")
+        except KeyboardInterrupt:
+            break
+        except Exception as e:
+            print(f"⚠️ Jetstream connection lost: {e}")
+        finally:
+            if cursor and cursor != saved_cursor:
+                save_cursor(cursor_path, cursor)
+                saved_cursor, saved_at = cursor, time.monotonic()
+
+        delay = RECONNECT_DELAYS[min(failures, len(RECONNECT_DELAYS) - 1)]
+        failures += 1
+        print(f"🔌 Reconnecting in {delay}s")
+        time.sleep(delay)
+
+# ========== REPLAY SERVER ==========
+
+def load_events(path):
+    with open(path, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def replay_handler(events):
+    def handler(ws):
+        query = parse_qs(urlparse(ws.request.path).query)
+        dids = set(query.get("wantedDids", []))
+        collections = set(query.get("wantedCollections", []))
+        cursor = int(query.get("cursor", ["0"])[0])
+
+        for event in events:
+            if event.get("time_us", 0) < cursor:
+                continue
+            if dids and event.get("did") not in dids:
+                continue
+            collection = (event.get("commit") or {}).get("collection")
+            if collections and collection not in collections:
+                continue
+            ws.send(json.dumps(event))
+
+    return handler
+
+def replay(path, port=REPLAY_PORT):
+    events = load_events(path)
+    with serve(replay_handler(events), "localhost", port) as server:
+        print(f"🔁 Replaying {len(events)} events on ws://localhost:{port}/subscribe")
+        server.serve_forever()
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 3 and sys.argv[1] == "replay":
+        replay(sys.argv[2], int(sys.argv[3]) if len(sys.argv) > 3 else REPLAY_PORT)
+    else:
+        print("Usage: python jetstream.py replay <events.jsonl> [port]")
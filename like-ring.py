@@ -1,13 +1,32 @@
 import os
+import sys
+import json
+import time
 import requests
-from datetime import datetime
+from datetime import date, datetime, timezone
 from dotenv import load_dotenv
 
+import http_trace
+from feed_scan import load_watermarks, parse_time, save_watermarks, scan_author_feed
+from history import History
+from ring_topology import DEFAULT_DEGREE, likers_by_target, plan_pairs
+
 # Load env vars
 load_dotenv()
+http_trace.install()  # HTTP_TRACE=record|replay, see http_trace.py
 
 # ========== BOT CONFIGURATION ==========
 
+WATERMARKS_FILE = "like-ring-watermarks.json"
+JETSTREAM_CURSOR_FILE = "like-ring-jetstream.cursor"
+LIKED_PATH = "like-ring-liked"  # "<liker> <post uri>" for every like made, both modes
+SESSION_REFRESH_INTERVAL = 60 * 60  # access tokens expire after ~2h
+
+# mesh | ring | kregular | weighted, see ring_topology.py
+TOPOLOGY = os.getenv("LIKE_RING_TOPOLOGY", "mesh")
+DEGREE = int(os.getenv("LIKE_RING_DEGREE", DEFAULT_DEGREE))
+WEIGHTS_FILE = "like-ring-weights.json"  # handle -> recent engagement score
+
 BOTS = [
     {
         "handle": os.getenv("ZENBITES_HANDLE"),
@@ -45,22 +64,15 @@ def create_session(handle, password):
     res.raise_for_status()
     return res.json()
 
-def fetch_latest_post(handle, access_token):
-    headers = {"Authorization": f"Bearer {access_token}"}
-    res = requests.get(
-        f"https://bsky.social/xrpc/app.bsky.feed.getAuthorFeed?actor={handle}&limit=1",
-        headers=headers
+def refresh_session(session):
+    res = requests.post(
+        "https://bsky.social/xrpc/com.atproto.server.refreshSession",
+        headers={"Authorization": f"Bearer {session['refreshJwt']}"},
     )
     res.raise_for_status()
-    feed = res.json().get("feed", [])
-    if feed:
-        return {
-            "uri": feed[0]["post"].get("uri"),
-            "cid": feed[0]["post"].get("cid")
-        }
-    return None
+    return res.json()
 
-def like_post(access_token, post):
+def like_post(access_token, did, post):
     payload = {
         "$type": "app.bsky.feed.like",
         "subject": {
@@ -79,7 +91,7 @@ def like_post(access_token, post):
         "https://bsky.social/xrpc/com.atproto.repo.createRecord",
         headers=headers,
         json={
-            "repo": get_did(access_token),
+            "repo": did,
             "collection": "app.bsky.feed.like",
             "record": payload
         }
@@ -89,31 +101,120 @@ def like_post(access_token, post):
         print("👍 Liked:", post["uri"])
     else:
         print("❌ Failed to like:", post["uri"], res.status_code, res.text)
-
-def get_did(access_token):
-    headers = {"Authorization": f"Bearer {access_token}"}
-    res = requests.get("https://bsky.social/xrpc/com.atproto.server.getSession", headers=headers)
-    res.raise_for_status()
-    return res.json()["did"]
+    return res.status_code == 200
+
+def like_once(liked, liker, session, post):
+    # Polling and listen mode see posts through different clocks, so their
+    # watermarks can't rule out a double like; the liked-URI history can.
+    key = f"{liker} {post['uri']}"
+    if key in liked:
+        return
+    if like_post(session["accessJwt"], session["did"], post):
+        liked.add(key)
+
+# ========== TOPOLOGY ==========
+
+def load_weights():
+    if not os.path.exists(WEIGHTS_FILE):
+        return {}
+    with open(WEIGHTS_FILE, "r") as f:
+        return json.load(f)
+
+def plan_likers():
+    handles = [bot['handle'] for bot in BOTS]
+    weights = load_weights() if TOPOLOGY == "weighted" else {}
+    pairs = plan_pairs(
+        len(handles),
+        TOPOLOGY,
+        DEGREE,
+        [weights.get(handle, 0.0) for handle in handles],
+        seed=http_trace.today().isoformat(),  # the recorded day when replaying
+    )
+    print(f"🕸️ {TOPOLOGY} topology: {len(pairs)} likes planned")
+    return likers_by_target(handles, pairs)
 
 # ========== MAIN ==========
 
+def login_all():
+    sessions = {}
+    for bot in BOTS:
+        print(f"\n🔐 Logging in as: {bot['handle']}")
+        sessions[bot['handle']] = create_session(bot['handle'], bot['app_password'])
+    return sessions
+
 def main():
     print("\n=== Starting Like-Ring Automation ===")
-    for liker in BOTS:
-        print(f"\n🔐 Logging in as: {liker['handle']}")
-        liker_session = create_session(liker['handle'], liker['app_password'])
-        liker_token = liker_session["accessJwt"]
-
-        for target in BOTS:
-            if target['handle'] == liker['handle']:
-                continue  # Skip self-liking
-
-            target_post = fetch_latest_post(target['handle'], liker_token)
-            if target_post:
-                like_post(liker_token, target_post)
+    watermarks = load_watermarks(WATERMARKS_FILE)
+    sessions = login_all()
+    likers_for = plan_likers()
+
+    for target in BOTS:
+        likers = likers_for[target['handle']]
+        if not likers:
+            continue  # Nobody likes this target today; its posts wait
+
+        target_session = sessions[target['handle']]
+        new_posts, watermark = scan_author_feed(
+            target['handle'],
+            target_session["did"],
+            target_session["accessJwt"],
+            watermarks.get(target['handle']),
+        )
+        print(f"\n📰 {target['handle']}: {len(new_posts)} new post(s)")
+
+        with History(LIKED_PATH) as liked:
+            for liker in likers:
+                for post in new_posts:
+                    like_once(liked, liker, sessions[liker], post)
+
+        if watermark:
+            watermarks[target['handle']] = watermark
+            save_watermarks(WATERMARKS_FILE, watermarks)
 
     print("\n✅ Like-Ring Completed")
 
+# ========== JETSTREAM MODE ==========
+
+def listen_main():
+    # Imported here so polling mode doesn't need the websockets package.
+    from jetstream import listen
+
+    print("\n=== Starting Like-Ring Listener ===")
+    watermarks = load_watermarks(WATERMARKS_FILE)
+    sessions = login_all()
+    handles_by_did = {session["did"]: handle for handle, session in sessions.items()}
+    refreshed_at = time.monotonic()
+    likers_for = plan_likers()
+    planned_on = date.today()
+
+    def on_post(post):
+        nonlocal refreshed_at, likers_for, planned_on
+        if time.monotonic() - refreshed_at > SESSION_REFRESH_INTERVAL:
+            for handle, session in sessions.items():
+                sessions[handle] = refresh_session(session)
+            refreshed_at = time.monotonic()
+        if date.today() != planned_on:
+            likers_for = plan_likers()
+            planned_on = date.today()
+
+        target = handles_by_did[post["did"]]
+        print(f"\n⚡ New post from {target}: {post['uri']}")
+        with History(LIKED_PATH) as liked:
+            for liker in likers_for[target]:
+                like_once(liked, liker, sessions[liker], post)
+
+        # Spares polling mode a rescan of what was handled here. The watermark
+        # only ever moves forward, even for out-of-order events.
+        seen_at = datetime.fromtimestamp(post["time_us"] / 1_000_000, timezone.utc)
+        current = watermarks.get(target)
+        if current is None or seen_at > parse_time(current):
+            watermarks[target] = seen_at.isoformat().replace("+00:00", "Z")
+            save_watermarks(WATERMARKS_FILE, watermarks)
+
+    listen(set(handles_by_did), on_post, JETSTREAM_CURSOR_FILE)
+
 if __name__ == "__main__":
-    main()
+    if "--listen" in sys.argv[1:]:
+        listen_main()
+    else:
+        main()
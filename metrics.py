@@ -0,0 +1,222 @@
+import json
+import os
+import random
+import sqlite3
+import sys
+import time
+
+import requests
+
+# Engagement metrics for the posters. Every post's uri/cid is recorded when
+# createRecord succeeds, together with the query and tags that produced it;
+# `python metrics.py refresh` then samples like/repost/reply/quote counts for
+# recent posts, 25 per app.bsky.feed.getPosts call on the public AppView, into
+# a time series. The latest sample of each post scores its query and tags,
+# which the posters use to weight their query choice and the like-ring can
+# use as its weighted-topology input (`python metrics.py export-weights`).
+#
+# Like-ring likes are counted too; they add roughly the same amount to every
+# post of a bot, so comparing queries within one bot stays fair.
+
+METRICS_PATH = os.getenv("BOT_METRICS_DB", "metrics.db")
+GET_POSTS_URL = "https://public.api.bsky.app/xrpc/app.bsky.feed.getPosts"
+BATCH_SIZE = 25             # getPosts maximum
+TRACK_AGE = 14 * 24 * 60 * 60   # posts older than this are no longer sampled
+PRIOR_POSTS = 3             # smoothing: each query starts at the bot average
+WEIGHTS_FILE = "like-ring-weights.json"
+
+ENGAGEMENT_WEIGHTS = {"likes": 1, "reposts": 3, "replies": 2, "quotes": 3}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS posts (
+    uri TEXT PRIMARY KEY,
+    cid TEXT NOT NULL,
+    bot TEXT NOT NULL,
+    query TEXT,
+    tags TEXT NOT NULL DEFAULT '',
+    posted_at INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS posts_posted_at ON posts (posted_at);
+CREATE TABLE IF NOT EXISTS samples (
+    uri TEXT NOT NULL,
+    sampled_at INTEGER NOT NULL,
+    likes INTEGER NOT NULL,
+    reposts INTEGER NOT NULL,
+    replies INTEGER NOT NULL,
+    quotes INTEGER NOT NULL,
+    PRIMARY KEY (uri, sampled_at)
+);
+"""
+
+# ========== DATABASE ==========
+
+def connect():
+    db = sqlite3.connect(METRICS_PATH, timeout=30)
+    db.executescript(SCHEMA)
+    return db
+
+def record_post(bot, uri, cid, query=None, tags=""):
+    db = connect()
+    try:
+        db.execute(
+            "INSERT OR IGNORE INTO posts (uri, cid, bot, query, tags, posted_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (uri, cid, bot, query, tags, int(time.time())),
+        )
+        db.commit()
+    finally:
+        db.close()
+
+# ========== SAMPLING ==========
+
+def fetch_posts(uris):
+    res = requests.get(GET_POSTS_URL, params={"uris": uris}, timeout=15)
+    res.raise_for_status()
+    return res.json().get("posts", [])
+
+def refresh(max_age=TRACK_AGE):
+    db = connect()
+    now = int(time.time())
+
+    try:
+        uris = [
+            uri for (uri,) in db.execute(
+                "SELECT uri FROM posts WHERE posted_at >= ? ORDER BY posted_at",
+                (now - max_age,),
+            )
+        ]
+        sampled = 0
+        for start in range(0, len(uris), BATCH_SIZE):
+            # Deleted posts are simply missing from the response.
+            for post in fetch_posts(uris[start:start + BATCH_SIZE]):
+                db.execute(
+                    "INSERT OR REPLACE INTO samples "
+                    "(uri, sampled_at, likes, reposts, replies, quotes) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        post["uri"],
+                        now,
+                        post.get("likeCount", 0),
+                        post.get("repostCount", 0),
+                        post.get("replyCount", 0),
+                        post.get("quoteCount", 0),
+                    ),
+                )
+                sampled += 1
+            db.commit()
+    finally:
+        db.close()
+
+    requests_made = -(-len(uris) // BATCH_SIZE)
+    print(f"📈 Sampled {sampled} of {len(uris)} posts in {requests_made} requests.")
+    return sampled
+
+# ========== PERFORMANCE ==========
+
+def latest_scores(bot=None, max_age=None):
+    db = connect()
+    sql = (
+        "SELECT p.bot, p.query, p.tags, s.likes, s.reposts, s.replies, s.quotes "
+        "FROM posts p JOIN samples s ON s.uri = p.uri "
+        "WHERE s.sampled_at = (SELECT MAX(sampled_at) FROM samples WHERE uri = p.uri)"
+    )
+    params = []
+    if bot is not None:
+        sql += " AND p.bot = ?"
+        params.append(bot)
+    if max_age is not None:
+        sql += " AND p.posted_at >= ?"
+        params.append(int(time.time()) - max_age)
+
+    try:
+        return [
+            {
+                "bot": row[0],
+                "query": row[1],
+                "tags": row[2],
+                "score": sum(
+                    weight * count
+                    for weight, count in zip(ENGAGEMENT_WEIGHTS.values(), row[3:])
+                ),
+            }
+            for row in db.execute(sql, params)
+        ]
+    finally:
+        db.close()
+
+def group_scores(scores, keys_of):
+    # name -> (posts, mean score)
+    totals = {}
+    for score in scores:
+        for name in keys_of(score):
+            posts, total = totals.get(name, (0, 0))
+            totals[name] = (posts + 1, total + score["score"])
+    return {name: (posts, total / posts) for name, (posts, total) in totals.items()}
+
+def score_query(score):
+    return [score["query"]] if score["query"] else []
+
+def score_tags(score):
+    return {tag.strip().lower() for tag in score["tags"].split(",") if tag.strip()}
+
+def query_performance(bot=None):
+    return group_scores(latest_scores(bot), score_query)
+
+def tag_performance(bot=None):
+    return group_scores(latest_scores(bot), score_tags)
+
+# ========== QUERY WEIGHTS ==========
+
+def query_weights(bot, queries):
+    # Smoothed mean score per query relative to the bot's average, so queries
+    # without data keep weight 1 and a single lucky post can't dominate.
+    scores = latest_scores(bot)
+    if not scores:
+        return {query: 1.0 for query in queries}
+
+    average = sum(s["score"] for s in scores) / len(scores) or 1.0
+    performance = group_scores(scores, score_query)
+    weights = {}
+    for query in queries:
+        posts, mean = performance.get(query, (0, average))
+        smoothed = (posts * mean + PRIOR_POSTS * average) / (posts + PRIOR_POSTS)
+        weights[query] = max(smoothed / average, 0.1)
+    return weights
+
+def weighted_choice(bot, queries):
+    weights = query_weights(bot, queries)
+    return random.choices(queries, [weights[query] for query in queries])[0]
+
+# ========== LIKE-RING EXPORT ==========
+
+def export_ring_weights(path=WEIGHTS_FILE, max_age=TRACK_AGE):
+    performance = group_scores(latest_scores(max_age=max_age), lambda s: [s["bot"]])
+    weights = {bot: round(mean, 2) for bot, (_, mean) in sorted(performance.items())}
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(weights, f, indent=2)
+    os.replace(tmp_path, path)
+    print(f"⚖️ Wrote like-ring weights for {len(weights)} accounts to {path}")
+    return weights
+
+def report(bot=None):
+    for title, performance in (
+        ("Queries", query_performance(bot)),
+        ("Tags", tag_performance(bot)),
+    ):
+        print(f"{title}:")
+        ranked = sorted(performance.items(), key=lambda item: item[1][1], reverse=True)
+        for name, (posts, mean) in ranked:
+            print(f"  {mean:8.1f}  {posts:4d} posts  {name}")
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command == "refresh":
+        refresh()
+    elif command == "report":
+        report(sys.argv[2] if len(sys.argv) > 2 else None)
+    elif command == "export-weights":
+        export_ring_weights(*sys.argv[2:3])
+    else:
+        print("Usage: python metrics.py refresh | report [handle] | export-weights [path]")
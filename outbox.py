@@ -0,0 +1,164 @@
+import json
+import os
+import time
+import zlib
+from datetime import datetime, timezone
+
+import requests
+
+import breaker
+from gallery import download_images, upload_images
+
+# Write-ahead outbox for a posting bot. The post in flight is written to disk
+# before each step, along with the stage it reached:
+#
+#   selected   content chosen, rkey and createdAt fixed
+#   uploaded   image blob(s) uploaded, blob refs recorded
+#   posted     createRecord succeeded, uri/cid recorded
+#
+# A run that finds an entry resumes from its stage instead of starting over,
+# and because the record key is fixed when the post is planned, retrying
+# createRecord can never produce a second copy of the same post. run() drives
+# a post through the stages; the bots supply only what differs between them.
+#
+# A post createRecord rejects for good (a 4xx other than auth or rate limits,
+# or MAX_ATTEMPTS failures of any kind) is given up on: the entry is moved to
+# <path>.failed for inspection and its content retired, so one bad post can't
+# stall the bot.
+
+STAGES = ("selected", "uploaded", "posted")
+MAX_ATTEMPTS = 5                # createRecord calls before a post is given up on
+RETRYABLE_STATUSES = {401, 408, 429}
+RETRYABLE_ERRORS = {"ExpiredToken", "InvalidToken", "RateLimitExceeded"}
+
+TID_ALPHABET = "234567abcdefghijklmnopqrstuvwxyz"
+
+# ========== RECORD KEYS ==========
+
+def make_tid(micros, clock_id):
+    # atproto TID: 53 bits of microseconds, 10 bits of clock id, encoded as
+    # 13 base32-sortable characters.
+    value = (micros << 10) | (clock_id & 0x3FF)
+    chars = []
+    for _ in range(13):
+        chars.append(TID_ALPHABET[value & 0x1F])
+        value >>= 5
+    return "".join(reversed(chars))
+
+def planned_rkey(handle, micros):
+    return make_tid(micros, zlib.crc32(handle.encode()))
+
+# ========== STORAGE ==========
+
+def load(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+def save(path, entry):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(entry, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def clear(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+# ========== STAGES ==========
+
+def plan(path, handle, **fields):
+    micros = time.time_ns() // 1000
+    created_at = datetime.fromtimestamp(micros / 1_000_000, timezone.utc)
+    entry = {
+        "stage": "selected",
+        "rkey": planned_rkey(handle, micros),
+        "created_at": created_at.isoformat(timespec="milliseconds").replace("+00:00", "Z"),
+        **fields,
+    }
+    save(path, entry)
+    return entry
+
+def advance(path, entry, stage, **fields):
+    entry = {**entry, **fields, "stage": stage}
+    save(path, entry)
+    return entry
+
+def give_up(path, entry, retire, reason):
+    save(f"{path}.failed", {**entry, "reason": reason})
+    clear(path)
+    retire(entry)
+    print(f"🗑️ Gave up on post {entry['rkey']} ({reason}), kept in {path}.failed")
+
+# ========== ERRORS ==========
+
+def xrpc_error(response):
+    # XRPC errors carry their name in the JSON body: {"error": ..., "message": ...}
+    try:
+        body = response.json()
+    except ValueError:
+        return None
+    return body.get("error") if isinstance(body, dict) else None
+
+def rejected_for_good(response):
+    return (
+        400 <= response.status_code < 500
+        and response.status_code not in RETRYABLE_STATUSES
+        and xrpc_error(response) not in RETRYABLE_ERRORS
+    )
+
+# ========== RUN ==========
+
+def run(path, handle, choose, image_urls, cdn, create_session, create_post,
+        find_post, finish, retire):
+    # choose() returns the fields of a new post, image_urls(entry) what to
+    # download through the `cdn` breaker, and finish(entry) records a posted
+    # entry (metrics, history) before the outbox is cleared. retire(entry)
+    # keeps the content of a post given up on from being chosen again.
+    entry = load(path)
+    resumed = entry is not None
+    if resumed:
+        print(f"♻️ Resuming {entry['stage']} post {entry['rkey']}")
+    else:
+        entry = plan(path, handle, **choose())
+
+    session = create_session()
+    access_token = session["accessJwt"]
+    did = session["did"]
+
+    if entry["stage"] == "selected":
+        urls = image_urls(entry)
+        try:
+            images = breaker.call(cdn, lambda: download_images(urls))
+        except Exception:
+            clear(path)  # nothing uploaded yet, pick afresh next run
+            raise
+        uploaded = upload_images(access_token, images)
+        entry = advance(path, entry, "uploaded", uploaded=uploaded)
+
+    if entry["stage"] == "uploaded":
+        record = find_post(access_token, did, entry["rkey"]) if resumed else None
+        if not record:
+            attempts = entry.get("attempts", 0)
+            if attempts >= MAX_ATTEMPTS:
+                give_up(path, entry, retire, f"{attempts} failed attempts")
+                raise RuntimeError(f"❌ Post {entry['rkey']} failed {attempts} times.")
+            # Counted before the call, so runs that crash during it count too.
+            entry = advance(path, entry, "uploaded", attempts=attempts + 1)
+            try:
+                record = create_post(access_token, did, entry)
+            except requests.HTTPError as e:
+                error = xrpc_error(e.response)
+                if error == "BlobNotFound":
+                    advance(path, entry, "selected")  # blob expired, upload again
+                elif rejected_for_good(e.response):
+                    give_up(path, entry, retire, error or f"HTTP {e.response.status_code}")
+                raise
+        entry = advance(path, entry, "posted", uri=record["uri"], cid=record["cid"])
+
+    finish(entry)
+    clear(path)
+    return entry
@@ -0,0 +1,140 @@
+import json
+import sqlite3
+import time
+
+import requests
+
+from pixabay_quota import record_quota, reserve_quota
+
+# Local SQLite index of Pixabay search hits. A bot harvests every one of its
+# queries in bulk off-peak (`<bot>.py --harvest`), then picks its daily image
+# from the index with a full-text match on tags and no network call.
+
+# ========== LIMITS ==========
+
+PIXABAY_API = "https://pixabay.com/api/"
+PER_PAGE = 200              # Pixabay maximum
+MAX_RESULTS = 500           # Pixabay never pages past this many hits
+REQUEST_BUDGET = 60         # per harvest; pixabay_quota paces the actual rate
+
+# Image URLs returned by the API are only valid for about a day, so hits older
+# than this are neither served nor kept.
+MAX_AGE = 23 * 60 * 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS hits (
+    id INTEGER PRIMARY KEY,
+    query TEXT NOT NULL,
+    harvested_at INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS hits_harvested_at ON hits (harvested_at);
+CREATE VIRTUAL TABLE IF NOT EXISTS hit_tags USING fts5(tags);
+"""
+
+# ========== DATABASE ==========
+
+def connect(path):
+    db = sqlite3.connect(path)
+    db.executescript(SCHEMA)
+    return db
+
+def store_hits(db, query, hits, now):
+    for hit in hits:
+        db.execute(
+            "INSERT OR REPLACE INTO hits (id, query, harvested_at, data) VALUES (?, ?, ?, ?)",
+            (hit["id"], query, now, json.dumps(hit)),
+        )
+        db.execute("DELETE FROM hit_tags WHERE rowid = ?", (hit["id"],))
+        db.execute(
+            "INSERT INTO hit_tags (rowid, tags) VALUES (?, ?)",
+            (hit["id"], hit.get("tags", "")),
+        )
+
+def cache_hits(path, query, hits):
+    db = connect(path)
+    try:
+        store_hits(db, query, hits, int(time.time()))
+        db.commit()
+    finally:
+        db.close()
+
+def prune(db, now):
+    cutoff = now - MAX_AGE
+    db.execute(
+        "DELETE FROM hit_tags WHERE rowid IN (SELECT id FROM hits WHERE harvested_at < ?)",
+        (cutoff,),
+    )
+    db.execute("DELETE FROM hits WHERE harvested_at < ?", (cutoff,))
+
+# ========== HARVEST ==========
+
+def harvest(path, api_key, queries, params, budget=REQUEST_BUDGET):
+    db = connect(path)
+    now = int(time.time())
+    requests_made = 0
+    stored = 0
+
+    try:
+        for query in queries:
+            page = 1
+            while requests_made < budget and (page - 1) * PER_PAGE < MAX_RESULTS:
+                reserve_quota()
+                res = requests.get(
+                    PIXABAY_API,
+                    params={
+                        "key": api_key,
+                        "q": query,
+                        "page": page,
+                        "per_page": PER_PAGE,
+                        **params,
+                    },
+                    timeout=15,
+                )
+                requests_made += 1
+                record_quota(res.headers)
+                res.raise_for_status()
+                data = res.json()
+
+                hits = data.get("hits", [])
+                store_hits(db, query, hits, now)
+                db.commit()
+                stored += len(hits)
+
+                if page * PER_PAGE >= min(data.get("totalHits", 0), MAX_RESULTS):
+                    break
+                page += 1
+
+        prune(db, now)
+        db.commit()
+    finally:
+        db.close()
+
+    print(f"🗂️ Harvested {stored} hits for {len(queries)} queries in {requests_made} requests.")
+    return stored
+
+# ========== SELECTION ==========
+
+def match_expression(tags):
+    return " OR ".join(f'"{tag}"' for tag in sorted(tags))
+
+def indexed_hits(path, tags=None, max_age=MAX_AGE):
+    db = connect(path)
+    cutoff = int(time.time()) - max_age
+
+    try:
+        if tags:
+            rows = db.execute(
+                "SELECT hits.data, hits.query FROM hit_tags "
+                "JOIN hits ON hits.id = hit_tags.rowid "
+                "WHERE hit_tags MATCH ? AND hits.harvested_at >= ?",
+                (match_expression(tags), cutoff),
+            )
+        else:
+            rows = db.execute(
+                "SELECT data, query FROM hits WHERE harvested_at >= ?", (cutoff,)
+            )
+        # Each hit remembers the query that found it, for metrics attribution.
+        return [{**json.loads(data), "query": query} for data, query in rows]
+    finally:
+        db.close()
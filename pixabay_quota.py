@@ -0,0 +1,93 @@
+import fcntl
+import json
+import os
+import tempfile
+import time
+
+# Token bucket for the Pixabay API key shared by every bot on this machine.
+# The bucket lives in a small JSON file guarded by flock, so independent cron
+# processes see the same count: callers reserve a request before searching
+# (briefly waiting for the window to reset if it is spent) and feed the
+# X-RateLimit-* headers of the response back in to keep the count honest.
+
+QUOTA_FILE = os.getenv(
+    "PIXABAY_QUOTA_FILE", os.path.join(tempfile.gettempdir(), "pixabay-quota.json")
+)
+DEFAULT_LIMIT = 100     # requests per window, per the Pixabay API docs
+WINDOW = 60             # seconds
+MAX_WAIT = 90           # longest a caller queues before giving up
+PACING = True           # off while http_trace replays, since nothing reaches Pixabay
+
+class QuotaExhausted(RuntimeError):
+    pass
+
+# ========== STATE ==========
+
+def read_state(f, now):
+    f.seek(0)
+    raw = f.read()
+    state = json.loads(raw) if raw.strip() else {}
+    state.setdefault("limit", DEFAULT_LIMIT)
+    if now >= state.get("reset_at", 0):
+        state["remaining"] = state["limit"]
+        state["reset_at"] = now + WINDOW
+    return state
+
+def write_state(f, state):
+    f.seek(0)
+    f.truncate()
+    json.dump(state, f)
+    f.flush()
+
+def locked_update(update):
+    with open(QUOTA_FILE, "a+") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            now = time.time()
+            state = read_state(f, now)
+            result = update(state, now)
+            write_state(f, state)
+            return result
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+# ========== API ==========
+
+def reserve_quota(max_wait=MAX_WAIT):
+    if not PACING:
+        return
+    deadline = time.monotonic() + max_wait
+
+    def take(state, now):
+        if state["remaining"] > 0:
+            state["remaining"] -= 1
+            return 0
+        return state["reset_at"] - now
+
+    while True:
+        wait = locked_update(take)
+        if not wait:
+            return
+        if time.monotonic() + wait > deadline:
+            raise QuotaExhausted("❌ Pixabay quota exhausted, try again later.")
+        print(f"⏳ Pixabay quota spent, waiting {wait:.1f}s")
+        time.sleep(wait)
+
+def record_quota(headers):
+    if not PACING:
+        return
+    try:
+        limit = int(headers["X-RateLimit-Limit"])
+        remaining = int(headers["X-RateLimit-Remaining"])
+        reset = float(headers["X-RateLimit-Reset"])
+    except (KeyError, ValueError):
+        return
+
+    def sync(state, now):
+        # Other processes may hold reservations the server hasn't seen yet,
+        # so never raise the local count above what the server reports.
+        state["limit"] = limit
+        state["remaining"] = min(state["remaining"], remaining)
+        state["reset_at"] = now + reset
+
+    locked_update(sync)
@@ -0,0 +1,124 @@
+import math
+import random
+import re
+
+# Scores Pixabay search hits using only the fields the search JSON already
+# returns, so a bot downloads only the images it posts - and the smallest
+# rendition that still clears the quality floor.
+
+# ========== LIMITS ==========
+
+BLOB_LIMIT = 1_000_000      # Bluesky uploadBlob limit for images (bytes)
+MIN_EDGE = 960              # quality floor for the longest image edge (px)
+TARGET_ASPECT = 3 / 2       # what the feed crops horizontal photos towards
+MAX_ASPECT_DRIFT = 0.7      # |log(ratio / target)| beyond this is rejected
+TOP_CANDIDATES = 5          # random picks come from this many best-scored hits
+
+# webformatURL ends in "_640" and can be swapped for the other sizes Pixabay
+# serves. Each size fits the image inside its own (max width, max height) box:
+# _180 and _340 are heights, _640 is the long edge, _960 fits 960x720.
+# largeImageURL tops out at 1280px on the long edge.
+WEBFORMAT_BOXES = (
+    ("180", (math.inf, 180)),
+    ("340", (math.inf, 340)),
+    ("640", (640, 640)),
+    ("960", (960, 720)),
+)
+LARGE_BOX = (1280, 1280)
+
+TOKEN_RE = re.compile(r"[a-z]+")
+
+# ========== TAGS ==========
+
+def compile_tags(words):
+    return frozenset(word.lower() for word in words)
+
+def hit_tokens(hit):
+    return frozenset(TOKEN_RE.findall(hit.get("tags", "").lower()))
+
+# ========== URL VARIANTS ==========
+
+def scaled_size(width, height, box):
+    max_width, max_height = box
+    factor = min(1.0, max_width / width, max_height / height)
+    return round(width * factor), round(height * factor)
+
+def url_variants(hit):
+    webformat = hit.get("webformatURL", "")
+    if "_640." in webformat:
+        for suffix, box in WEBFORMAT_BOXES:
+            yield webformat.replace("_640.", f"_{suffix}."), box
+    if hit.get("largeImageURL"):
+        yield hit["largeImageURL"], LARGE_BOX
+
+def choose_variant(hit, min_edge=MIN_EDGE, blob_limit=BLOB_LIMIT):
+    width = hit.get("imageWidth") or 0
+    height = hit.get("imageHeight") or 0
+    if not width or not height or max(width, height) < min_edge:
+        return None
+
+    bytes_per_pixel = (hit.get("imageSize") or 0) / (width * height)
+
+    # Variants are ordered smallest first, so the first one that clears the
+    # floor is also the cheapest one to download.
+    for url, box in url_variants(hit):
+        w, h = scaled_size(width, height, box)
+        if max(w, h) < min_edge:
+            continue
+        if w * h * bytes_per_pixel > blob_limit:
+            return None
+        return {"url": url, "width": w, "height": h}
+    return None
+
+# ========== SCORING ==========
+
+def rank_hits(
+    hits,
+    tags=None,
+    posted_ids=(),
+    aspect=TARGET_ASPECT,
+    min_edge=MIN_EDGE,
+    blob_limit=BLOB_LIMIT,
+    query_weights=None,
+):
+    # posted_ids only needs membership tests, so a history.History works as
+    # well as a set of ID strings.
+    candidates = []
+
+    for hit in hits:
+        if str(hit.get("id")) in posted_ids:
+            continue
+
+        tokens = hit_tokens(hit)
+        matched = len(tokens & tags) if tags else 0
+        if tags and not matched:
+            continue
+
+        variant = choose_variant(hit, min_edge, blob_limit)
+        if not variant:
+            continue
+
+        drift = abs(math.log(variant["width"] / variant["height"] / aspect))
+        if drift > MAX_ASPECT_DRIFT:
+            continue
+
+        # Hits found by queries that have performed well rank higher.
+        weight = query_weights.get(hit.get("query"), 1.0) if query_weights else 1.0
+
+        candidates.append({
+            "id": hit["id"],
+            "url": variant["url"],
+            "width": variant["width"],
+            "height": variant["height"],
+            "tags": hit.get("tags", ""),
+            "query": hit.get("query"),
+            "score": matched - drift + math.log(weight),
+        })
+
+    candidates.sort(key=lambda c: c["score"], reverse=True)
+    return candidates
+
+def select_hits(hits, count=1, top=TOP_CANDIDATES, **kwargs):
+    candidates = rank_hits(hits, **kwargs)
+    pool = candidates[:max(top, count)]
+    return random.sample(pool, min(count, len(pool)))
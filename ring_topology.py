@@ -0,0 +1,172 @@
+import random
+from math import ceil
+from datetime import date
+
+# Like-ring topologies. A plan is the list of (liker, target) index pairs for
+# one run, computed once up front: "mesh" is every ordered pair (N*(N-1)
+# likes), the others give every account k outgoing likes (N*k).
+#
+#   mesh      every bot likes every other bot
+#   ring      bot i likes bots i+1 .. i+k
+#   kregular  a ring over a random permutation, reseeded daily, so every bot
+#             likes and is liked by exactly k others but the pairs rotate
+#   weighted  every bot likes k others, chosen so that targets are liked in
+#             proportion to their recent engagement
+
+TOPOLOGIES = ("mesh", "ring", "kregular", "weighted")
+DEFAULT_DEGREE = 3
+WEIGHT_FLOOR = 1.0      # keeps quiet accounts reachable in weighted mode
+
+# ========== PLANNERS ==========
+
+def circulant_pairs(order, k):
+    pairs = []
+    for offset in range(1, k + 1):
+        pairs.extend(zip(order, order[offset:] + order[:offset]))
+    return pairs
+
+def like_quotas(n, k, weights):
+    # Incoming likes per target are weight * scale, capped at N-1 (everyone
+    # else); what a capped target can't take is spread over the rest. Returns
+    # the capped weights and the scale.
+    weights = [(weight if weight > 0 else 0.0) + WEIGHT_FLOOR for weight in weights]
+    total = sum(weights)
+    cap = n - 1
+    scale = n * k / total
+    full = []
+
+    while max(weights) * scale > cap:
+        over = [weight for weight in weights if weight * scale > cap]
+        if len(over) == len(full) or len(over) == n:
+            break
+        full = over
+        scale = (n * k - cap * len(full)) / (total - sum(full))
+
+    if full:
+        limit = cap / scale
+        weights = [min(weight, limit) for weight in weights]
+    return weights, scale
+
+def weighted_pairs(n, k, weights, rng):
+    # Systematic sampling turns the quotas into exactly N*k slots: targets are
+    # laid out in random order, one random offset, then each target owns the
+    # slots between its cumulative bounds. Slot s goes to liker s % N, so every
+    # liker gets k slots N apart and, since a target owns at most N-1
+    # contiguous slots, never the same target twice. A target holds its own
+    # slot only if one of its slots is congruent to it mod N.
+    quotas, scale = like_quotas(n, k, weights)
+    draw = rng.random
+    keys = [draw() for _ in range(n)]
+    order = sorted(range(n), key=keys.__getitem__)  # cheaper than rng.shuffle
+    offset = 1.0 - draw()  # in (0, 1], so the last bound is exactly N*k
+
+    targets = []
+    starts = [0] * n
+    bounds = [0] * n
+    self_likes = []
+    start = 0
+    cumulative = 0.0
+    for target in order:
+        cumulative += quotas[target]
+        bound = ceil(cumulative * scale - offset)
+        count = bound - start
+        targets += [target] * count
+        starts[target] = start
+        bounds[target] = bound
+        own = (target - start) % n
+        if own < count:
+            self_likes.append(start + own)
+        start = bound
+
+    pairs = list(zip(list(range(n)) * k, targets))
+    if self_likes and not repair_self_likes(pairs, self_likes, starts, bounds):
+        # Tiny fleets can leave a self-like with no valid swap; it is dropped.
+        return [(liker, target) for liker, target in pairs if liker != target]
+    return pairs
+
+def repair_self_likes(pairs, self_likes, starts, bounds):
+    # A slot dealt to its own target swaps likers with a slot of some liker
+    # that doesn't like the target yet, whose own target the first target
+    # doesn't like either, so the swap creates neither a self-like nor a
+    # repeated pair. As dealt, liker x likes t exactly when one of its slots
+    # x, x+N, ... falls in t's block, which is one modulo, and the likers with
+    # no slot there are the residues just past it; the few pairs the swaps
+    # change are kept in `swapped`. Returns whether every self-like was
+    # repaired.
+    n = len(starts)
+    slots = len(pairs)
+    swapped = {}
+
+    def likes(liker, target):
+        if (liker, target) in swapped:
+            return swapped[liker, target]
+        return (liker - starts[target]) % n < bounds[target] - starts[target]
+
+    def swap_slot(own):
+        for liker in range(bounds[own], starts[own] + n):
+            liker %= n
+            if likes(liker, own):
+                continue  # given a slot of it by an earlier swap
+            for other in range(liker, slots, n):
+                if pairs[other][0] == liker and not likes(own, pairs[other][1]):
+                    return other
+
+        # Earlier swaps moved some likers off their residues; in small fleets
+        # those may be the only candidates left.
+        for other in range(slots):
+            liker, target = pairs[other]
+            if liker != own and target != own and not (
+                likes(liker, own) or likes(own, target)
+            ):
+                return other
+        return None
+
+    repaired = True
+    for slot in self_likes:
+        own = pairs[slot][1]
+        if pairs[slot][0] != own:
+            continue  # already fixed by an earlier swap
+
+        other = swap_slot(own)
+        if other is None:
+            repaired = False
+            continue
+        liker, target = pairs[other]
+        pairs[slot] = (liker, own)
+        pairs[other] = (own, target)
+        swapped.update({
+            (own, own): False,
+            (liker, target): False,
+            (liker, own): True,
+            (own, target): True,
+        })
+    return repaired
+
+def plan_pairs(n, mode="mesh", k=DEFAULT_DEGREE, weights=None, seed=None):
+    if mode not in TOPOLOGIES:
+        raise ValueError(f"Unknown like-ring topology: {mode}")
+    if n < 2:
+        return []
+
+    if mode == "mesh" or k >= n - 1:
+        return [(i, j) for i in range(n) for j in range(n) if i != j]
+
+    if mode == "ring":
+        return circulant_pairs(list(range(n)), k)
+
+    rng = random.Random(date.today().isoformat() if seed is None else seed)
+
+    if mode == "kregular":
+        order = list(range(n))
+        rng.shuffle(order)
+        return circulant_pairs(order, k)
+
+    return weighted_pairs(n, k, weights or [0.0] * n, rng)
+
+# ========== HELPERS ==========
+
+def likers_by_target(handles, pairs):
+    likers = {handle: [] for handle in handles}
+    for liker, target in pairs:
+        likers[handles[target]].append(handles[liker])
+    return likers
@@ -1,14 +1,20 @@
 import requests
-from datetime import datetime, timezone
-from PIL import Image
-from io import BytesIO
 import random
 import os
 import re
+import json
 from dotenv import load_dotenv
 
+import breaker
+import http_trace
+import metrics
+import outbox
+from gallery import MAX_IMAGES, images_embed
+from history import History
+
 # ========== LOAD ENV ==========
 load_dotenv()
+http_trace.install()  # HTTP_TRACE=record|replay, see http_trace.py
 
 # ========== CONFIG ==========
 
@@ -17,9 +23,13 @@ APP_PASSWORD = os.getenv("TRACKLY_APP_PASSWORD")
 
 BLUESKY_HANDLE = "trackly.bsky.social"
 GUMROAD_HOME = "https://trackly.gumroad.com"
-HISTORY_FILE = "posted_products.txt"
-IMAGE_PATH = "image.jpg"
+HISTORY_FILE = "posted_products.txt"  # legacy text history, migrated on first run
+HISTORY_PATH = "trackly-history"
+CATALOG_CACHE = "gumroad_products.json"
+OUTBOX_PATH = "trackly-outbox.json"
+IMAGES_PER_POST = min(int(os.getenv("TRACKLY_IMAGES_PER_POST", 1)), MAX_IMAGES)
 ALT_TEXT = "trackly.gumroad.com"
+MAX_POST_LENGTH = 300      # Bluesky post text limit (graphemes)
 
 # Safety check (important)
 if not GUMROAD_TOKEN or not APP_PASSWORD:
@@ -28,18 +38,16 @@ if not GUMROAD_TOKEN or not APP_PASSWORD:
 # ========== HISTORY TRACKING ==========
 
 def load_posted_ids():
-    if not os.path.exists(HISTORY_FILE):
-        return []
-    with open(HISTORY_FILE, "r") as f:
-        return f.read().splitlines()
+    return History(HISTORY_PATH, legacy_path=HISTORY_FILE)
 
-def save_posted_id(product_id):
-    with open(HISTORY_FILE, "a") as f:
-        f.write(f"{product_id}\n")
+def save_posted_ids(product_ids):
+    with load_posted_ids() as posted_ids:
+        for product_id in product_ids:
+            posted_ids.add(product_id)
 
 # ========== GUMROAD FETCHING ==========
 
-def fetch_gumroad_products():
+def fetch_catalog():
     url = f"https://api.gumroad.com/v2/products?access_token={GUMROAD_TOKEN}"
     res = requests.get(url, timeout=15)
     res.raise_for_status()
@@ -48,28 +56,35 @@ def fetch_gumroad_products():
     if not data.get("success"):
         raise Exception("❌ Gumroad API request failed.")
 
+    tmp_path = f"{CATALOG_CACHE}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data["products"], f)
+    os.replace(tmp_path, CATALOG_CACHE)
+    return data["products"]
+
+def load_cached_catalog():
+    if not os.path.exists(CATALOG_CACHE):
+        raise RuntimeError("❌ Gumroad is unavailable and no catalog is cached.")
+    with open(CATALOG_CACHE, "r") as f:
+        return json.load(f)
+
+def fetch_gumroad_products():
+    products = breaker.call("gumroad", fetch_catalog, load_cached_catalog)
+
     all_products = [
-        p for p in data["products"]
+        p for p in products
         if "Tracker" in p["name"] and p.get("thumbnail_url")
     ]
 
-    posted_ids = load_posted_ids()
-    available = [p for p in all_products if p["id"] not in posted_ids]
-
-    if not available:
-        print("🔁 All products posted, restarting list.")
-        open(HISTORY_FILE, "w").close()
-        available = all_products
+    with load_posted_ids() as posted_ids:
+        available = [p for p in all_products if p["id"] not in posted_ids]
 
-    return random.choice(available)
+        if not available:
+            print("🔁 All products posted, restarting list.")
+            posted_ids.clear()
+            available = all_products
 
-def download_image(image_url):
-    res = requests.get(image_url, timeout=15)
-    img = Image.open(BytesIO(res.content))
-    if img.mode != "RGB":
-        img = img.convert("RGB")
-    img.save(IMAGE_PATH, format="JPEG", quality=85, optimize=True)
-    print("✅ Image downloaded.")
+    return random.sample(available, min(IMAGES_PER_POST, len(available)))
 
 # ========== BLUESKY POSTING ==========
 
@@ -82,48 +97,46 @@ def create_session():
     res.raise_for_status()
     return res.json()
 
-def upload_image(access_token):
-    with open(IMAGE_PATH, "rb") as f:
-        image_data = f.read()
-
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "image/jpeg"
-    }
-
-    res = requests.post(
-        "https://bsky.social/xrpc/com.atproto.repo.uploadBlob",
-        headers=headers,
-        data=image_data,
-        timeout=15
+def find_post(access_token, did, rkey):
+    res = requests.get(
+        "https://bsky.social/xrpc/com.atproto.repo.getRecord",
+        headers={"Authorization": f"Bearer {access_token}"},
+        params={"repo": did, "collection": "app.bsky.feed.post", "rkey": rkey},
+        timeout=10
     )
-    res.raise_for_status()
-    return res.json()["blob"]
-
-def create_post(access_token, did, image_blob, product):
-    with Image.open(IMAGE_PATH) as img:
-        width, height = img.size
-
-    desc = re.sub("<.*?>", "", product.get("description", "")).strip()
-    short_desc = desc.split(".")[0] + "." if "." in desc else desc
-
-    caption = f"{short_desc}\n\nCheck out the full collection:\n{GUMROAD_HOME}"
+    return res.json() if res.status_code == 200 else None
+
+def short_description(product):
+    desc = re.sub("<.*?>", "", product.get("description") or "").strip()
+    return desc.split(".")[0] + "." if "." in desc else desc
+
+def build_caption(products):
+    footer = f"\n\nCheck out the full collection:\n{GUMROAD_HOME}"
+    if len(products) == 1:
+        description = short_description(products[0])
+        room = MAX_POST_LENGTH - len(footer)
+        if len(description) > room:
+            description = description[:room - 1].rstrip() + "…"
+        return description + footer
+
+    # A gallery names each product instead, dropping names that would push
+    # the post past the length limit.
+    lines = []
+    for product in products:
+        line = f"• {product['name']}"
+        if len("\n".join(lines + [line])) + len(footer) > MAX_POST_LENGTH:
+            break
+        lines.append(line)
+    return "\n".join(lines) + footer
+
+def create_post(access_token, did, entry):
+    caption = build_caption(entry["products"])
 
     post = {
         "$type": "app.bsky.feed.post",
         "text": caption,
-        "createdAt": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
-        "embed": {
-            "$type": "app.bsky.embed.images",
-            "images": [{
-                "alt": ALT_TEXT,
-                "image": image_blob,
-                "aspectRatio": {
-                    "width": int(width),
-                    "height": int(height)
-                }
-            }]
-        }
+        "createdAt": entry["created_at"],
+        "embed": images_embed(entry["uploaded"], ALT_TEXT)
     }
 
     headers = {
@@ -134,6 +147,7 @@ def create_post(access_token, did, image_blob, product):
     payload = {
         "repo": did,
         "collection": "app.bsky.feed.post",
+        "rkey": entry["rkey"],
         "record": post
     }
 
@@ -148,22 +162,48 @@ def create_post(access_token, did, image_blob, product):
         print("📤 Trackly posted successfully!")
     else:
         print("❌ Posting failed:", res.status_code, res.text)
+    res.raise_for_status()
+    return res.json()
 
 # ========== MAIN ==========
 
-def main():
-    try:
-        product = fetch_gumroad_products()
-        download_image(product["thumbnail_url"])
+def choose_post():
+    products = fetch_gumroad_products()
+    return {
+        "products": [
+            {key: product.get(key) for key in ("id", "name", "description", "thumbnail_url")}
+            for product in products
+        ],
+    }
 
-        session = create_session()
-        access_token = session["accessJwt"]
-        did = session["did"]
+def retire_products(entry):
+    save_posted_ids(product["id"] for product in entry["products"])
 
-        image_blob = upload_image(access_token)
-        create_post(access_token, did, image_blob, product)
-        save_posted_id(product["id"])
+def record_posted(entry):
+    metrics.record_post(
+        BLUESKY_HANDLE,
+        entry["uri"],
+        entry["cid"],
+        tags=", ".join(product["name"] for product in entry["products"]),
+    )
+    retire_products(entry)
 
+def main():
+    try:
+        outbox.run(
+            OUTBOX_PATH,
+            BLUESKY_HANDLE,
+            choose=choose_post,
+            image_urls=lambda entry: [
+                product["thumbnail_url"] for product in entry["products"]
+            ],
+            cdn="gumroad-cdn",
+            create_session=create_session,
+            create_post=create_post,
+            find_post=find_post,
+            finish=record_posted,
+            retire=retire_products,
+        )
     except Exception as e:
         print("❌ Trackly bot error:", e)
 
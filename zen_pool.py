@@ -0,0 +1,103 @@
+import sqlite3
+import time
+
+import requests
+
+# Local pool of zen quotes. It is refilled in bulk from the zenquotes.io batch
+# endpoint and drained one quote per post, so posting never waits on the
+# remote API. Quotes are deduplicated by text and only marked used once a post
+# carrying them exists, so a quote is never posted twice or lost to a failed
+# run.
+
+ZENQUOTES_BATCH = "https://zenquotes.io/api/quotes"
+
+# Rate-limit notices come back in the quote list, attributed to the API itself.
+API_AUTHOR = "zenquotes.io"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS quotes (
+    text TEXT PRIMARY KEY,
+    author TEXT NOT NULL,
+    added_at INTEGER NOT NULL,
+    used_at INTEGER
+);
+CREATE INDEX IF NOT EXISTS quotes_unused ON quotes (added_at) WHERE used_at IS NULL;
+"""
+
+# ========== DATABASE ==========
+
+def connect(path):
+    db = sqlite3.connect(path)
+    db.executescript(SCHEMA)
+    return db
+
+def add_quotes(path, quotes):
+    db = connect(path)
+    now = int(time.time())
+    try:
+        before = db.total_changes
+        db.executemany(
+            "INSERT OR IGNORE INTO quotes (text, author, added_at) VALUES (?, ?, ?)",
+            [
+                (q["q"].strip(), q["a"].strip(), now)
+                for q in quotes
+                if q.get("q") and q.get("a") != API_AUTHOR
+            ],
+        )
+        db.commit()
+        return db.total_changes - before
+    finally:
+        db.close()
+
+def unused_count(path):
+    db = connect(path)
+    try:
+        return db.execute("SELECT COUNT(*) FROM quotes WHERE used_at IS NULL").fetchone()[0]
+    finally:
+        db.close()
+
+def format_quote(text, author):
+    return f'"{text}" – {author}'
+
+def next_quote(path):
+    # Returns (text, author) of the oldest unused quote without using it up;
+    # the caller marks it with mark_used() once the post exists.
+    db = connect(path)
+    try:
+        return db.execute(
+            "SELECT text, author FROM quotes WHERE used_at IS NULL "
+            "ORDER BY added_at LIMIT 1"
+        ).fetchone()
+    finally:
+        db.close()
+
+def mark_used(path, text):
+    db = connect(path)
+    try:
+        db.execute(
+            "UPDATE quotes SET used_at = ? WHERE text = ? AND used_at IS NULL",
+            (int(time.time()), text),
+        )
+        db.commit()
+    finally:
+        db.close()
+
+def reuse_quote(path):
+    # Fallback for when the pool is empty and zenquotes.io is down.
+    db = connect(path)
+    try:
+        row = db.execute(
+            "SELECT text, author FROM quotes ORDER BY random() LIMIT 1"
+        ).fetchone()
+        return format_quote(*row) if row else None
+    finally:
+        db.close()
+
+# ========== REFILL ==========
+
+def refill(path):
+    res = requests.get(ZENQUOTES_BATCH, timeout=10)
+    res.raise_for_status()
+    added = add_quotes(path, res.json())
+    print(f"🧘 Added {added} new quotes ({unused_count(path)} unused).")
+    return added
@@ -1,14 +1,25 @@
 from openai import OpenAI  # unused now, kept for future
 import requests
-import random
-from datetime import datetime, timezone
-from PIL import Image
-from io import BytesIO
 from dotenv import load_dotenv
 import os
+import sys
+
+import breaker
+import http_trace
+import metrics
+import outbox
+from gallery import MAX_IMAGES, images_embed
+from history import History
+from pixabay_index import cache_hits, harvest, indexed_hits
+from pixabay_quota import QuotaExhausted, record_quota, reserve_quota
+from pixabay_select import select_hits
+from zen_pool import (
+    format_quote, mark_used, next_quote, refill, reuse_quote, unused_count
+)
 
 # Load environment variables
 load_dotenv()
+http_trace.install()  # HTTP_TRACE=record|replay, see http_trace.py
 
 # ========== ENV CONFIG ==========
 
@@ -17,7 +28,13 @@ APP_PASSWORD = os.getenv("ZENBITES_APP_PASSWORD")
 
 BLUESKY_HANDLE = "zenbites.bsky.social"
 ALT_TEXT = ""
-IMAGE_PATH = "zenbites-image.jpg"
+HISTORY_FILE = "zenbites-posted.txt"  # legacy text history, migrated on first run
+HISTORY_PATH = "zenbites-history"
+INDEX_PATH = "zenbites-index.db"
+IMAGES_PER_POST = min(int(os.getenv("ZENBITES_IMAGES_PER_POST", 1)), MAX_IMAGES)
+OUTBOX_PATH = "zenbites-outbox.json"
+QUOTES_PATH = "zenbites-quotes.db"
+QUOTE_POOL_LOW = 10
 
 # Safety check (important)
 if not PIXABAY_API_KEY or not APP_PASSWORD:
@@ -37,56 +54,97 @@ PROMPTS = [
     "calm ocean waves",
 ]
 
+PIXABAY_PARAMS = {
+    "image_type": "photo",
+    "orientation": "horizontal",
+    "safesearch": "true",
+}
+
+# ========== HISTORY TRACKING ==========
+
+def load_posted_ids():
+    return History(HISTORY_PATH, legacy_path=HISTORY_FILE)
+
+def save_posted_ids(image_ids):
+    with load_posted_ids() as posted_ids:
+        for image_id in image_ids:
+            posted_ids.add(image_id)
+
 # ========== ZEN QUOTE ==========
 
 def get_zen_quote():
+    # Returns (caption, pool text); the pool text is marked used after posting.
+    pooled = next_quote(QUOTES_PATH)
+    if pooled:
+        return format_quote(*pooled), pooled[0]
+
+    print("⚠️ Quote pool empty, fetching one live.")
     try:
-        res = requests.get("https://zenquotes.io/api/random", timeout=10)
-        res.raise_for_status()
-        data = res.json()[0]
-        return f'"{data["q"]}" – {data["a"]}'
+        quote = breaker.call(
+            "zenquotes", fetch_zen_quote, lambda: reuse_quote(QUOTES_PATH)
+        )
+        if quote:
+            return quote, None
     except Exception as e:
         print("⚠️ Quote fetch failed:", e)
-        return "Breathe. You’re doing just fine. 🌿"
+    return "Breathe. You’re doing just fine. 🌿", None
 
-# ========== PIXABAY IMAGE ==========
+def fetch_zen_quote():
+    res = requests.get("https://zenquotes.io/api/random", timeout=10)
+    res.raise_for_status()
+    data = res.json()[0]
+    return format_quote(data["q"], data["a"])
 
-def get_pixabay_image():
-    query = random.choice(PROMPTS)
-    print(f"🌄 Querying Pixabay for: {query}")
+# ========== PIXABAY IMAGE ==========
 
-    url = (
-        "https://pixabay.com/api/"
-        f"?key={PIXABAY_API_KEY}"
-        f"&q={query.replace(' ', '+')}"
-        "&image_type=photo"
-        "&orientation=horizontal"
-        "&safesearch=true"
-        "&per_page=20"
+def search_pixabay(query):
+    reserve_quota()
+    response = requests.get(
+        "https://pixabay.com/api/",
+        params={"key": PIXABAY_API_KEY, "q": query, "per_page": 20, **PIXABAY_PARAMS},
+        timeout=15,
     )
-
-    response = requests.get(url, timeout=15)
+    record_quota(response.headers)
     response.raise_for_status()
-    data = response.json()
-
-    if not data.get("hits"):
-        raise RuntimeError("No images found on Pixabay.")
+    hits = response.json().get("hits", [])
+    cache_hits(INDEX_PATH, query, hits)
+    return [{**hit, "query": query} for hit in hits]
+
+def get_pixabay_images():
+    posted_ids = load_posted_ids()
+
+    selected = select_hits(
+        indexed_hits(INDEX_PATH),
+        IMAGES_PER_POST,
+        posted_ids=posted_ids,
+        query_weights=metrics.query_weights(BLUESKY_HANDLE, PROMPTS),
+    )
+    if selected:
+        for image in selected:
+            print("🗂️ Selected indexed image:", image["url"])
+        return selected
 
-    image_url = random.choice(data["hits"])["largeImageURL"]
-    print("✅ Image URL:", image_url)
-    return image_url
+    query = metrics.weighted_choice(BLUESKY_HANDLE, PROMPTS)
+    print(f"🌄 Querying Pixabay for: {query}")
 
-# ========== DOWNLOAD IMAGE ==========
+    # No fallback: the index was just searched. With the breaker open this
+    # fails at once, before any quota is reserved.
+    hits = breaker.call(
+        "pixabay",
+        lambda: search_pixabay(query),
+        local_errors=(QuotaExhausted,),
+    )
 
-def download_image(image_url):
-    img_data = requests.get(image_url, timeout=20).content
-    img = Image.open(BytesIO(img_data))
+    if not hits:
+        raise RuntimeError("No images found on Pixabay.")
 
-    if img.mode != "RGB":
-        img = img.convert("RGB")
+    selected = select_hits(hits, IMAGES_PER_POST, posted_ids=posted_ids)
+    if not selected:
+        raise RuntimeError("No usable images found on Pixabay.")
 
-    img.save(IMAGE_PATH, format="JPEG", quality=85, optimize=True)
-    print("✅ Image saved.")
+    for image in selected:
+        print("✅ Image URL:", image["url"])
+    return selected
 
 # ========== BLUESKY API ==========
 
@@ -99,43 +157,21 @@ def create_session():
     res.raise_for_status()
     return res.json()
 
-def upload_image(access_token):
-    with open(IMAGE_PATH, "rb") as f:
-        image_data = f.read()
-
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "image/jpeg"
-    }
-
-    res = requests.post(
-        "https://bsky.social/xrpc/com.atproto.repo.uploadBlob",
-        headers=headers,
-        data=image_data,
-        timeout=15
+def find_post(access_token, did, rkey):
+    res = requests.get(
+        "https://bsky.social/xrpc/com.atproto.repo.getRecord",
+        headers={"Authorization": f"Bearer {access_token}"},
+        params={"repo": did, "collection": "app.bsky.feed.post", "rkey": rkey},
+        timeout=10
     )
-    res.raise_for_status()
-    return res.json()["blob"]
-
-def create_post(access_token, did, image_blob, caption):
-    with Image.open(IMAGE_PATH) as img:
-        width, height = img.size
+    return res.json() if res.status_code == 200 else None
 
+def create_post(access_token, did, entry):
     post = {
         "$type": "app.bsky.feed.post",
-        "text": caption,
-        "createdAt": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
-        "embed": {
-            "$type": "app.bsky.embed.images",
-            "images": [{
-                "alt": ALT_TEXT,
-                "image": image_blob,
-                "aspectRatio": {
-                    "width": width,
-                    "height": height
-                }
-            }]
-        }
+        "text": entry["caption"],
+        "createdAt": entry["created_at"],
+        "embed": images_embed(entry["uploaded"], ALT_TEXT)
     }
 
     headers = {
@@ -146,6 +182,7 @@ def create_post(access_token, did, image_blob, caption):
     payload = {
         "repo": did,
         "collection": "app.bsky.feed.post",
+        "rkey": entry["rkey"],
         "record": post
     }
 
@@ -157,20 +194,59 @@ def create_post(access_token, did, image_blob, caption):
     )
     res.raise_for_status()
     print("📿 Zenbite posted successfully.")
+    return res.json()
 
 # ========== EXECUTION ==========
 
-try:
-    caption = get_zen_quote()
-    image_url = get_pixabay_image()
-    download_image(image_url)
-
-    session = create_session()
-    access_token = session["accessJwt"]
-    did = session["did"]
+def choose_post():
+    images = get_pixabay_images()
+    caption, quote = get_zen_quote()
+    return {"caption": caption, "quote": quote, "images": images}
+
+def retire_content(entry):
+    save_posted_ids(image["id"] for image in entry["images"])
+    if entry.get("quote"):
+        mark_used(QUOTES_PATH, entry["quote"])
+
+def record_posted(entry):
+    metrics.record_post(
+        BLUESKY_HANDLE,
+        entry["uri"],
+        entry["cid"],
+        query=entry["images"][0].get("query"),
+        tags=", ".join(image["tags"] for image in entry["images"]),
+    )
+    retire_content(entry)
 
-    image_blob = upload_image(access_token)
-    create_post(access_token, did, image_blob, caption)
+def main():
+    try:
+        outbox.run(
+            OUTBOX_PATH,
+            BLUESKY_HANDLE,
+            choose=choose_post,
+            image_urls=lambda entry: [image["url"] for image in entry["images"]],
+            cdn="pixabay-cdn",
+            create_session=create_session,
+            create_post=create_post,
+            find_post=find_post,
+            finish=record_posted,
+            retire=retire_content,
+        )
+    except Exception as e:
+        print("❌ Zenbite failed:", e)
 
-except Exception as e:
-    print("❌ Zenbite failed:", e)
+def top_up_quotes():
+    try:
+        if unused_count(QUOTES_PATH) < QUOTE_POOL_LOW:
+            breaker.call("zenquotes", lambda: refill(QUOTES_PATH))
+    except Exception as e:
+        print("⚠️ Quote refill failed:", e)
+
+if __name__ == "__main__":
+    if "--harvest" in sys.argv[1:]:
+        harvest(INDEX_PATH, PIXABAY_API_KEY, PROMPTS, PIXABAY_PARAMS)
+    elif "--refill" in sys.argv[1:]:
+        refill(QUOTES_PATH)
+    else:
+        main()
+        top_up_quotes()